@@ -0,0 +1,215 @@
+"""Benchmark suite for AddressBook operations on synthetic books.
+
+Run from the repository root:
+    python benchmarks/bench_book.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/bench_book.py --sizes 1000 10000 --compare results.json
+
+For every book size this times add_record, find, find_by_item, find_by_note,
+search_by_tag, get_birthdays_per_week, find_similar (with misspelled names),
+save_to_file and load_address_book_from_file, and reports throughput, latency percentiles
+(p50/p90/p99) and peak memory. --output writes the results as JSON;
+--compare checks a new run against such a file and exits with status 1
+if any operation's p50 got slower than --tolerance allows.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main
+
+FIRST_NAMES = ["anna", "piotr", "jan", "kasia", "tomasz", "ewa", "marek", "zofia", "adam", "ola",
+               "john", "maria", "li", "fatima", "carlos", "yuki", "olga", "ahmed", "sofia", "noah"]
+LAST_NAMES = ["nowak", "kowalski", "wisniewski", "smith", "garcia", "kim", "muller", "rossi",
+              "dubois", "silva", "tanaka", "ivanov", "brown", "lopez", "jensen"]
+DOMAINS = ["example.com", "mail.pl", "corp.io", "uni.edu", "post.de", "company.co.uk"]
+STREETS = ["Main Street", "Market Square", "Park Avenue", "Long Road", "Station Street", "Oak Lane"]
+CITIES = ["Krakow", "Warsaw", "Gdansk", "Berlin", "London", "Madrid", "Tokyo", "Boston"]
+WORDS = ["meeting", "call", "invoice", "project", "birthday", "lunch", "contract", "review",
+         "conference", "follow-up", "deadline", "gift", "travel", "offer", "support", "urgent"]
+TAGS = ["work", "family", "friends", "vip", "client", "supplier", "gym", "school", "urgent", "todo"]
+
+
+def make_record(rng, i):
+    name = f"{rng.choice(FIRST_NAMES)}_{rng.choice(LAST_NAMES)}_{i}"
+    record = main.Record(name)
+    for _ in range(rng.randint(1, 3)):
+        record.add_phone(f"{rng.randrange(10 ** 9, 10 ** 10)}")
+    if rng.random() < 0.8:
+        record.add_email(f"{name}@{rng.choice(DOMAINS)}")
+    if rng.random() < 0.7:
+        birthday = main.date(rng.randint(1940, 2005), rng.randint(1, 12), rng.randint(1, 28))
+        record.add_birthday(birthday.strftime("%d.%m.%Y"))
+    if rng.random() < 0.6:
+        record.add_address(f"{rng.randint(1, 200)} {rng.choice(STREETS)}, {rng.choice(CITIES)}")
+    if rng.random() < 0.5:
+        record.add_note(" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))))
+        for tag in rng.sample(TAGS, rng.randint(0, 3)):
+            record.note.add_tag(tag)
+    return record
+
+
+def misspell(rng, name):
+    """`name` with one letter dropped, replaced or inserted."""
+    i = rng.randrange(len(name))
+    edit = rng.choice(["drop", "replace", "insert"])
+    if edit == "drop":
+        return name[:i] + name[i + 1:]
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz0123456789")
+    return name[:i] + letter + (name[i + 1:] if edit == "replace" else name[i:])
+
+
+def generate_records(size, seed):
+    rng = random.Random(seed)
+    return [make_record(rng, i) for i in range(size)]
+
+
+def summarize(latencies_ns, operations=None):
+    operations = operations or len(latencies_ns)
+    ordered = sorted(latencies_ns)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] / 1e3
+
+    total = sum(latencies_ns) / 1e9
+    return {
+        "calls": len(latencies_ns),
+        "ops_per_sec": operations / total if total else None,
+        "p50_us": percentile(50),
+        "p90_us": percentile(90),
+        "p99_us": percentile(99),
+        "mean_us": statistics.fmean(latencies_ns) / 1e3,
+    }
+
+
+def timed(func, args_list, trace_memory):
+    latencies = []
+    if trace_memory:
+        tracemalloc.start()
+    with redirect_stdout(io.StringIO()):  # find_by_item prints its matches
+        for args in args_list:
+            start = time.perf_counter_ns()
+            func(*args)
+            latencies.append(time.perf_counter_ns() - start)
+    result = summarize(latencies)
+    if trace_memory:
+        result["peak_alloc_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def bench_size(size, queries, seed, storage, trace_memory):
+    rng = random.Random(seed + 1)
+    records = generate_records(size, seed)
+    results = {}
+
+    book = main.AddressBook()
+    if storage == "lazy":
+        # what load_address_book_from_file(..., lazy=True) sets up for a new file
+        book.data = main.LazyRecords(None, book)
+    results["add_record"] = timed(book.add_record, [(record,) for record in records], trace_memory)
+
+    sample = [rng.choice(records) for _ in range(queries)]
+    names = [(record.name.value,) for record in sample]
+    items = []
+    for record in sample:
+        choices = [record.name.value, record.phones[0].value]
+        if record.email:
+            choices.append(record.email[0].value)
+        if record.birthday:
+            choices.append(record.birthday.value)
+        items.append((rng.choice(choices),))
+    patterns = [(rng.choice(WORDS),) for _ in range(queries)] + [(f"{rng.choice(WORDS)} {rng.choice(WORDS)}",) for _ in range(queries)]
+    tags = [(rng.choice(TAGS),) for _ in range(queries)]
+    thresholds = [(rng.choice([7, 14, 30]),) for _ in range(queries)]
+    misspelled = [(misspell(rng, name),) for name, in names]
+
+    results["find"] = timed(book.find, names, trace_memory)
+    results["find_by_item"] = timed(book.find_by_item, items, trace_memory)
+    results["find_by_note"] = timed(book.find_by_note, patterns, trace_memory)
+    results["search_by_tag"] = timed(book.search_by_tag, tags, trace_memory)
+    results["get_birthdays_per_week"] = timed(book.get_birthdays_per_week, thresholds, trace_memory)
+    results["find_similar"] = timed(book.find_similar, misspelled, trace_memory)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "bench.dat")
+        results["save_to_file"] = timed(book.save_to_file, [(filename,)], trace_memory)
+        results["save_to_file"]["file_bytes"] = os.path.getsize(filename)
+        results["save_to_file"]["records_per_sec"] = size * results["save_to_file"]["ops_per_sec"]
+        del book, records, sample
+        results["load_address_book_from_file"] = timed(main.load_address_book_from_file, [(filename,)], trace_memory)
+        results["load_address_book_from_file"]["records_per_sec"] = size * results["load_address_book_from_file"]["ops_per_sec"]
+    results["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+def compare(current, baseline, tolerance):
+    """Print p50 changes against a previous run; return the list of regressions."""
+    regressions = []
+    for size, operations in current["results"].items():
+        old_operations = baseline["results"].get(size)
+        if not old_operations:
+            continue
+        for name, stats in operations.items():
+            old = old_operations.get(name)
+            if not isinstance(stats, dict) or not isinstance(old, dict):
+                continue
+            change = stats["p50_us"] / old["p50_us"] - 1 if old["p50_us"] else 0
+            flag = "REGRESSION" if change > tolerance else ""
+            print(f"{size:>10} {name:<30} {old['p50_us']:>12.1f} -> {stats['p50_us']:>12.1f} us  {change:+7.1%} {flag}")
+            if flag:
+                regressions.append((size, name, change))
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200, help="calls per query operation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--storage", choices=["pickle", "lazy"], default="pickle")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record peak Python allocations per operation (slower)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown, default 20%%")
+    options = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage": options.storage,
+        "queries": options.queries,
+        "seed": options.seed,
+        "results": {},
+    }
+    for size in options.sizes:
+        print(f"benchmarking {size} records...", file=sys.stderr)
+        report["results"][str(size)] = bench_size(size, options.queries, options.seed, options.storage, options.trace_memory)
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if options.compare:
+        with open(options.compare) as file:
+            regressions = compare(report, json.load(file), options.tolerance)
+        return 1 if regressions else 0
+    if not options.output:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,57 @@
+"""Microbenchmark: command dispatch latency, old fuzz.ratio cascade vs CommandDispatcher.
+
+Run from the repository root:
+    python benchmarks/bench_dispatch.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzywuzzy import fuzz
+from main import dispatcher
+
+# (command, threshold) in the order of the old if/elif chain in main(),
+# including the duplicated "all"/"add-birthday"/"show-birthday"/"birthdays" branches.
+LEGACY_CHAIN = [
+    ("add", 66), ("remove-phone", 91), ("change", 82), ("phone", 79), ("all", 66),
+    ("add-birthday", 91), ("show-birthday", 91), ("birthdays", 88), ("hello", 79),
+    ("all", 66), ("add-birthday", 91), ("show-birthday", 91), ("birthdays", 88),
+    ("add-note", 91), ("edit-note", 91), ("remove-note", 91), ("find-by-note", 91),
+    ("find-by-item", 91), ("add-address", 90), ("remove-address", 66),
+    ("add-email", 66), ("add-tag", 91), ("search-by-tag", 91),
+]
+
+INPUTS = ["add", "search-by-tag", "add-email", "find-by-item", "save", "help", "exit", "serch-by-tag", "xyz"]
+
+
+def legacy_dispatch(cmd):
+    for name, threshold in LEGACY_CHAIN:
+        if fuzz.ratio(cmd, name) > threshold:
+            # the matched branch re-ran fuzz.ratio for the "<100" and "==100" checks
+            fuzz.ratio(cmd, name)
+            fuzz.ratio(cmd, name)
+            return name
+    return None
+
+
+def new_dispatch(cmd):
+    command, exact = dispatcher.resolve(cmd)
+    return command.name if command else None
+
+
+def bench(func, number=2000):
+    results = {}
+    for cmd in INPUTS:
+        seconds = timeit.timeit(lambda: func(cmd), number=number)
+        results[cmd] = seconds / number * 1e6
+    return results
+
+
+if __name__ == "__main__":
+    before = bench(legacy_dispatch)
+    after = bench(new_dispatch)
+    print(f"{'input':<16}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for cmd in INPUTS:
+        print(f"{cmd:<16}{before[cmd]:>14.2f}{after[cmd]:>14.2f}{before[cmd] / after[cmd]:>9.1f}x")
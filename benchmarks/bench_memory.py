@@ -0,0 +1,77 @@
+"""Memory benchmark: bytes per contact for Record/Field objects and for a full AddressBook.
+
+Run from the repository root:
+    python benchmarks/bench_memory.py [--contacts N] [--module path/to/main.py]
+
+--module lets you measure another revision, e.g.
+    git show <rev>:main.py > /tmp/main_old.py
+    python benchmarks/bench_memory.py --module /tmp/main_old.py
+"""
+import argparse
+import gc
+import importlib.util
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAGS = ["work", "family", "friends", "gym", "school", "vip"]
+
+
+def load_module(path):
+    spec = importlib.util.spec_from_file_location("bench_main", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["bench_main"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_record(main, i):
+    record = main.Record(f"contact{i}")
+    record.add_phone(f"{500000000 + i:010d}")
+    record.add_phone(f"{600000000 + i:010d}")
+    record.add_email(f"contact{i}@example.com")
+    record.add_birthday(f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1960 + i % 50}")
+    record.add_address(f"{i % 200} Main Street")
+    record.add_note(f"met at conference {i % 97}")
+    for tag in (TAGS[i % len(TAGS)], TAGS[(i + 1) % len(TAGS)]):
+        record.note.add_tag("" + tag.upper().lower())
+    return record
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, kept
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=20000)
+    parser.add_argument("--module", default=os.path.join(ROOT, "main.py"))
+    options = parser.parse_args()
+    main_module = load_module(options.module)
+    n = options.contacts
+
+    records_bytes, _ = measure(lambda: [make_record(main_module, i) for i in range(n)])
+
+    def build_book():
+        book = main_module.AddressBook()
+        for i in range(n):
+            book.add_record(make_record(main_module, i))
+        return book
+
+    book_bytes, _ = measure(build_book)
+    print(f"module: {options.module}")
+    print(f"contacts: {n}")
+    print(f"records only: {records_bytes / n:.0f} bytes/contact")
+    print(f"address book: {book_bytes / n:.0f} bytes/contact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Startup benchmark: import cost of main.py and wall-clock time of running `help`.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py [--runs N] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+
+def import_time():
+    """Cumulative microseconds for `import main` as reported by python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def help_wall_clock(runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, MAIN, "--batch", "-"],
+            cwd=ROOT, input="help\n", capture_output=True, text=True, check=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true")
+    options = parser.parse_args()
+
+    imports = import_time()
+    timings = help_wall_clock(options.runs)
+    report = {
+        "import_main_us": imports.get("main"),
+        "fuzzywuzzy_imported": any(name.startswith("fuzzywuzzy") for name in imports),
+        "help_min_ms": min(timings) * 1000,
+        "help_median_ms": statistics.median(timings) * 1000,
+    }
+    if options.json:
+        print(json.dumps(report))
+    else:
+        print(f"import main: {report['import_main_us']} us (fuzzywuzzy imported: {report['fuzzywuzzy_imported']})")
+        print(f"help: min {report['help_min_ms']:.1f} ms, median {report['help_median_ms']:.1f} ms over {options.runs} runs")
+
+
+if __name__ == "__main__":
+    main()
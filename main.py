@@ -1,17 +1,227 @@
-from collections import UserDict
-from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, UserDict, deque
+from collections.abc import MutableMapping
+from itertools import groupby, islice, takewhile
+from contextlib import asynccontextmanager, nullcontext, redirect_stdout
+import copy
+import csv
+from datetime import date, datetime, timedelta
+import functools
+import io
+import json
+import mmap
+import os
 import pickle
-from fuzzywuzzy import fuzz
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
 import re
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# Characters outside ASCII that re.IGNORECASE matches against ASCII letters.
+CASE_FOLDS = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+
+def calendar_key(birthday):
+    day, month, _ = birthday.split(".")
+    return int(month), int(day)
+
+
+def is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def trigrams(text):
+    text = text.translate(CASE_FOLDS).lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def name_trigrams(name):
+    # padded so that short names and word boundaries still produce trigrams
+    return trigrams(f"  {name} ")
+
+
+# Letters NFKD does not split into a base letter and an accent.
+ADDRESS_FOLDS = str.maketrans({"ł": "l", "đ": "d", "ø": "o"})
+
+
+def reversed_domain(email):
+    """'ann@Mail.Example.com' -> 'com.example.mail', so a domain and its subdomains sort together."""
+    return ".".join(reversed(email.rpartition("@")[2].lower().split(".")))
+
+
+def address_tokens(text):
+    """Case- and accent-insensitive words of an address: 'Kraków, ul. Długa 5' -> {'krakow', 'ul', 'dluga', '5'}."""
+    import unicodedata
+    text = unicodedata.normalize("NFKD", str(text).casefold().translate(ADDRESS_FOLDS))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return set(re.findall(r"\w+", text))
+
+
+def update_postings(index, name, old_keys, new_keys):
+    for key in old_keys - new_keys:
+        names = index.get(key)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del index[key]
+    for key in new_keys - old_keys:
+        index.setdefault(key, set()).add(name)
+
+
+def similar_shortlist(postings, query, walk, candidates, budget):
+    """Return up to `candidates` names from `postings` (trigram -> names) sharing
+    the most of the `query` trigrams, and what is left of the walk `budget`.
+
+    Names are collected from the `walk` rarest query trigrams, a trigram
+    missing from `postings` counting as the rarest, and from the next ones
+    while they are short next to the budget left, which on small books
+    walks them all; the other lists only update the counts of names found.
+    """
+    shared = {}
+    lists = sorted((postings[trigram] for trigram in query if trigram in postings), key=len)
+    walk -= len(query) - len(lists)
+    settled = False
+    for position, names in enumerate(lists):
+        remaining = len(lists) - position - 1
+        if not shared or not settled and len(names) <= budget and (position < walk or len(names) <= budget // 30):
+            for other in islice(names, budget):
+                shared[other] = shared.get(other, 0) + 1
+            budget = max(budget - len(names), 0)
+            # a name not seen yet shares at most one trigram per remaining
+            # list; once the shortlist is certain to beat that, stop collecting
+            settled = sum(map(remaining.__lt__, shared.values())) >= candidates
+        else:
+            for other in shared.keys() & names:
+                shared[other] += 1
+    if len(shared) > candidates:
+        # only names reaching the count of the candidates-th best can make the cut
+        floor = sorted(shared.values(), reverse=True)[candidates - 1]
+        shared = {other: count for other, count in shared.items() if count >= floor}
+    return sorted(shared, key=lambda other: (-shared[other], other))[:candidates], budget
+
+
+class Stats:
+    """Call counts and latency histograms for commands and hot AddressBook paths.
+
+    Off unless ADDRESS_BOOK_STATS is set or 'stats on' is run; while off,
+    `timed` wrappers cost one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = bool(os.environ.get("ADDRESS_BOOK_STATS"))
+        self.lock = threading.Lock()
+        self.timings = {}
+
+    def record(self, name, seconds):
+        micros = int(seconds * 1e6)
+        # histogram bucket b holds durations in [2**(b-1), 2**b) microseconds
+        bucket = micros.bit_length()
+        with self.lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                entry = self.timings[name] = {"count": 0, "total_us": 0, "max_us": 0, "buckets": {}}
+            entry["count"] += 1
+            entry["total_us"] += micros
+            entry["max_us"] = max(entry["max_us"], micros)
+            entry["buckets"][bucket] = entry["buckets"].get(bucket, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.timings = {}
+
+    @staticmethod
+    def percentile(entry, fraction):
+        """Upper bound of the histogram bucket holding the given fraction of calls."""
+        wanted = fraction * entry["count"]
+        seen = 0
+        for bucket in sorted(entry["buckets"]):
+            seen += entry["buckets"][bucket]
+            if seen >= wanted:
+                return min(2 ** bucket, entry["max_us"])
+        return entry["max_us"]
+
+    def summary(self):
+        with self.lock:
+            timings = {name: dict(entry, buckets=dict(entry["buckets"])) for name, entry in self.timings.items()}
+        for entry in timings.values():
+            entry["mean_us"] = entry["total_us"] / entry["count"]
+            entry["p50_us"] = self.percentile(entry, 0.5)
+            entry["p99_us"] = self.percentile(entry, 0.99)
+        return timings
+
+
+stats = Stats()
+
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not stats.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def required_trigrams(pattern):
+    """Trigrams every case-insensitive match of `pattern` must contain.
+
+    Only runs of ASCII literals in mandatory positions are used; an empty
+    set means no prefilter is possible.
+    """
+    required = set()
+
+    def walk(items):
+        run = []
+        for op, value in items:
+            if op is sre_parse.LITERAL and value < 128:
+                run.append(chr(value))
+                continue
+            required.update(trigrams("".join(run)))
+            run = []
+            if op is sre_parse.SUBPATTERN:
+                walk(value[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and value[0] >= 1:
+                walk(value[2])
+        required.update(trigrams("".join(run)))
+
+    walk(sre_parse.parse(pattern))
+    return required
+
 
 class Field:
+    # Fields and records use __slots__ to keep per-contact memory small;
+    # __getstate__/__setstate__ also accept the __dict__ state of older pickles.
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
     def __str__(self):
         return str(self.value)
 
+    def __getstate__(self):
+        return {"value": self.value}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
 class Name(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         if value:  
             self.value = value
@@ -19,20 +229,40 @@ class Name(Field):
             raise ValueError("Name field is required")
 
 class Phone(Field):
+    # 10-digit numbers are kept as an int (zero-padded back on read)
+    __slots__ = ("number",)
+
     def __init__(self, value):
         if self.validate_phone(value):
             self.value = value
         else:
             raise ValueError("Invalid phone number: must be 10 digits")
+
+    @property
+    def value(self):
+        if isinstance(self.number, int):
+            return f"{self.number:010d}"
+        return self.number
+
+    @value.setter
+    def value(self, value):
+        if isinstance(value, str) and len(value) == 10 and value.isascii() and value.isdigit():
+            self.number = int(value)
+        else:
+            self.number = value
     
     def validate_phone(self, phone):
         return len(str(phone)) == 10
 
 class Address(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         self.value = value
 
 class Email(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         if self.validate_email(value):
             self.value = value
@@ -44,37 +274,72 @@ class Email(Field):
         return re.match(pattern, email) is not None
     
 class Birthday(Field):
+    __slots__ = ("date",)
+
     def __init__(self, value):
-        if self.validate_birthday(value):
+        self.date = self.parse_birthday(value)
+        if self.date:
             self.value = value
         else:
             raise ValueError("Invalid birthday: Date must be in the past and not more than 100 years ago, format DD.MM.YYYY required")
 
-    def validate_birthday(self, birthday):
+    def __getstate__(self):
+        return {"value": self.value, "date": self.date}
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if "date" not in state:
+            self.date = datetime.strptime(self.value, "%d.%m.%Y").date()
+
+    def parse_birthday(self, birthday):
         try:
             birthday_date = datetime.strptime(birthday, "%d.%m.%Y")
-            today = datetime.today()
-            if birthday_date > today:
-                return False
-            if today - birthday_date > timedelta(days=100*365.25):
-                return False
-            return True
         except ValueError:
-            return False
+            return None
+        today = datetime.today()
+        if birthday_date > today:
+            return None
+        if today - birthday_date > timedelta(days=100*365.25):
+            return None
+        return birthday_date.date()
+
+    def validate_birthday(self, birthday):
+        return self.parse_birthday(birthday) is not None
             
 class Note(Field):
+    __slots__ = ("tags", "owner")
 
     def __init__(self, value, tags=None):
         super().__init__(value)
-        self.tags = tags if tags else []
+        # dict keys keep insertion order and give O(1) membership checks;
+        # tags are interned since the same few are shared by many notes
+        self.tags = dict.fromkeys(map(sys.intern, tags)) if tags else {}
+        self.owner = None
+
+    def __getstate__(self):
+        return {"value": self.value, "tags": self.tags}
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.tags = dict.fromkeys(map(sys.intern, self.tags))
+        self.owner = None
 
     def add_tag(self, tag):
+        tag = sys.intern(tag)
         if tag not in self.tags:
-            self.tags.append(tag)
+            if self.owner is not None:
+                self.owner.touch()
+            self.tags[tag] = None
+            if self.owner is not None:
+                self.owner.reindex("tag", new=tag)
+                self.owner.log("add_tag", tag)
         else:
             print("Tag already exists.")
 
 class Record:
+    __slots__ = ("name", "phones", "email", "birthday", "note", "address", "book", "rendered", "__weakref__")
+    STATE = ("name", "phones", "email", "birthday", "note", "address")
+    FIELDS = ("name", "phones", "emails", "birthday", "addresses", "note", "tags")
     
     def __init__(self, name):
         self.name = Name(name)
@@ -83,30 +348,91 @@ class Record:
         self.birthday = None
         self.note = None
         self.address = []  
+        self.book = None
+        # str(self), cached until the next change
+        self.rendered = None
+
+    def __getstate__(self):
+        # the owning book is re-attached by AddressBook.add_record on load
+        return {key: getattr(self, key) for key in self.STATE}
+
+    def __setstate__(self, state):
+        self.address = []
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.book = None
+        self.rendered = None
+        if self.note:
+            self.note.owner = self
+
+    def reindex(self, kind, old=None, new=None):
+        if self.book is not None:
+            self.book.reindex(kind, self.name.value, old, new)
+
+    def reindex_note(self, old=None, new=None):
+        if self.book is not None:
+            self.book.reindex_note(self.name.value, old, new)
+
+    def address_tokens(self):
+        return set().union(*(address_tokens(address.value) for address in self.address))
+
+    def reindex_address(self, old=frozenset(), new=frozenset()):
+        if self.book is not None:
+            self.book.reindex_address(self.name.value, old, new)
+
+    def log(self, op, *args):
+        if self.book is not None:
+            self.book.log(op, self.name.value, *args)
+
+    def touch(self):
+        """Called before every change: drops the cached rendering, and lets a
+        pending save snapshot keep the old state."""
+        self.rendered = None
+        if self.book is not None and self.book.snapshot is not None:
+            self.book.touch(self)
 
     def add_address(self, address):
+        self.touch()
         if self.address is None:
             self.address =[]
+        old_tokens = self.address_tokens()
         self.address.append(Address(address))
+        self.reindex_address(old_tokens, self.address_tokens())
+        self.log("add_address", address)
     
     def remove_address(self, address):
+        self.touch()
+        self.reindex_address(old=self.address_tokens())
         self.address = []
-        print(f"All addressess removed from contact")
+        self.log("remove_address", address)
     
         
     def add_email(self,email):
+        self.touch()
         self.email.append(Email(email))
+        self.reindex("email", new=email)
+        self.log("add_email", email)
     
     def add_birthday(self, birthday):
+        self.touch()
+        old = self.birthday.value if self.birthday else None
         self.birthday = Birthday(birthday)
+        self.reindex("birthday", old, birthday)
+        self.log("add_birthday", birthday)
 
     def add_phone(self, phone):
+        self.touch()
         self.phones.append(Phone(phone))
+        self.reindex("phone", new=phone)
+        self.log("add_phone", phone)
 
     def edit_phone(self, old_phone, new_phone):
         for phone in self.phones:
             if phone.value == old_phone:
+                self.touch()
                 phone.value = new_phone
+                self.reindex("phone", old_phone, new_phone)
+                self.log("edit_phone", old_phone, new_phone)
 
     def find_phone(self, phone_number):
         for phone in self.phones:
@@ -115,23 +441,97 @@ class Record:
         return None
     
     def remove_phone(self, phone_number):
-        for phone in self.phones:
-            if phone.value == phone_number:
-                self.phones.remove(phone)
+        for phone in [phone for phone in self.phones if phone.value == phone_number]:
+            self.touch()
+            self.phones.remove(phone)
+            self.reindex("phone", old=phone_number)
+            self.log("remove_phone", phone_number)
 
     def add_note(self, note, tags=None):
+        self.touch()
+        self.remove_note()
         self.note = Note(note, tags)
+        self.note.owner = self
+        self.reindex_note(new=note)
+        for tag in self.note.tags:
+            self.reindex("tag", new=tag)
+        self.log("add_note", note, list(self.note.tags))
 
     def edit_note(self, note):
         if self.note:
+            self.touch()
+            self.reindex_note(self.note.value, note)
             self.note.value = note
+            self.log("edit_note", note)
         else:
             print("No note to edit. Please add a note first")
 
     def remove_note(self):
+        if self.note:
+            self.touch()
+            for tag in self.note.tags:
+                self.reindex("tag", old=tag)
+            self.reindex_note(old=self.note.value)
+            self.note.owner = None
+            self.log("remove_note")
         self.note = None
 
     def __str__(self):
+        if self.rendered is None:
+            self.rendered = self.render()
+        return self.rendered
+
+    def completeness(self):
+        return (len(self.phones) + len(self.email) + len(self.address)
+                + (self.birthday is not None) + (self.note is not None))
+
+    def merge(self, other):
+        """Add the phones, e-mails, addresses, birthday, note and tags of `other` that this record lacks."""
+        phones = {phone.value for phone in self.phones}
+        for phone in other.phones:
+            if phone.value not in phones:
+                self.add_phone(phone.value)
+        emails = {email.value.lower() for email in self.email}
+        for email in other.email:
+            if email.value.lower() not in emails:
+                self.add_email(email.value)
+        addresses = {address.value for address in self.address}
+        for address in other.address:
+            if address.value not in addresses:
+                self.add_address(address.value)
+        if self.birthday is None and other.birthday is not None:
+            self.add_birthday(other.birthday.value)
+        if other.note:
+            if not self.note:
+                self.add_note(other.note.value, list(other.note.tags))
+                return
+            if other.note.value and other.note.value not in self.note.value:
+                self.edit_note(f"{self.note.value}; {other.note.value}")
+            for tag in other.note.tags:
+                if tag not in self.note.tags:
+                    self.note.add_tag(tag)
+
+    @timed("render")
+    def render(self, fields=None):
+        """The full description, or only the given FIELDS in that order."""
+        if fields is not None:
+            parts = []
+            for field in fields:
+                if field == "name":
+                    parts.append(f"Contact name: {self.name.value}")
+                elif field == "phones":
+                    parts.append("Phones: " + ("; ".join(str(phone) for phone in self.phones) or "No phones"))
+                elif field == "emails":
+                    parts.append("e-mail: " + (", ".join(email.value for email in self.email) or "none"))
+                elif field == "birthday":
+                    parts.append(f"Birthday: {self.birthday.value if self.birthday else 'none'}")
+                elif field == "addresses":
+                    parts.append("Addresses: " + (", ".join(str(address.value) for address in self.address) or "none"))
+                elif field == "note":
+                    parts.append(f"Note: {self.note}")
+                elif field == "tags":
+                    parts.append("Tags: " + (", ".join(self.note.tags) if self.note and self.note.tags else "no tags"))
+            return ", ".join(parts)
         phone_str = "; ".join(str(phone) for phone in self.phones) if self.phones else "No phones"
         birthday_str = f", Birthday: {self.birthday.value}" if self.birthday else ""
         address_str = ", Addresses: " + ", ".join(str(address.value) for address in self.address) if self.address else ""
@@ -141,106 +541,2021 @@ class Record:
         return f"Contact name: {self.name.value}, Phones: {phone_str}{birthday_str}{address_str}{email_str}{note_str}{tag_str}"
 
 class AddressBook(UserDict):
+    INDEXED_FIELDS = ("phone", "email", "birthday", "tag")
+    # name trigram postings find_similar may walk per call; past that it only
+    # re-counts names already found, which bounds its work on huge books
+    SIMILAR_WALK_BUDGET = 10000
+    # an edit changes at most three trigrams of a name, so find_similar collects
+    # names from the 3 * SIMILAR_EDITS + 1 rarest postings of the query's
+    # trigrams: a name this many edits away is in one of them
+    SIMILAR_EDITS = 1
+    INDEX_ATTRIBUTES = ("indexes", "note_trigrams", "name_trigrams", "birthday_calendar", "phone_directory",
+                        "email_domains", "address_tokens")
+
+    def __init__(self, *args, **kwargs):
+        # value -> set of contact names, kept in sync by Record mutators
+        self.indexes = {kind: {} for kind in self.INDEXED_FIELDS}
+        # trigram of lower-cased note text -> set of contact names
+        self.note_trigrams = {}
+        # name length -> trigram of lower-cased contact name -> set of contact
+        # names, for find_similar
+        self.name_trigrams = {}
+        # sorted (month, day, name) tuples for birthday range queries
+        self.birthday_calendar = []
+        # sorted (phone, name) tuples for phone prefix lookups
+        self.phone_directory = []
+        # sorted (reversed e-mail domain, name) tuples, e.g. ("com.example", "ann")
+        self.email_domains = []
+        # normalized address word -> set of contact names
+        self.address_tokens = {}
+        # contact names in order; built on first use, then kept in sync
+        self.sorted_names = None
+        # False while a lazily loaded book has not needed its indexes yet
+        self.indexed = True
+        self.index_lock = threading.Lock()
+        self.journal = None
+        # number of shard files for sharded storage (0: not sharded) and the
+        # shards changed since the last save
+        self.shard_count = 0
+        self.dirty_shards = set()
+        # mutations so far and how many of them are on disk
+        self.changes = 0
+        self.saved_changes = 0
+        # records captured for a save still being written; see prepare_save
+        self.snapshot = None
+        self.snapshot_lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    @timed("ensure_indexes")
+    def ensure_indexes(self):
+        if self.indexed:
+            return
+        with self.index_lock:
+            if self.indexed:
+                return
+            # built aside and published at once, so that readers running
+            # concurrently (see AddressBookServer) never see half-built indexes
+            built = AddressBook()
+            for record in self.data.values():
+                built.index_record(record)
+            for attribute in self.INDEX_ATTRIBUTES:
+                setattr(self, attribute, getattr(built, attribute))
+            self.indexed = True
+
+    @property
+    def dirty(self):
+        return self.changes != self.saved_changes or bool(self.dirty_shards)
+
+    def resident_records(self):
+        """How many records this book holds in memory."""
+        if isinstance(self.data, (LazyRecords, SqliteRecords)):
+            return len(self.data.cache) + len(self.data.dirty)
+        return len(self.data)
+
+    def close(self):
+        if isinstance(self.data, (LazyRecords, SqliteRecords)):
+            self.data.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def mark_saved(self):
+        self.saved_changes = self.changes
+
+    def touch(self, record):
+        with self.snapshot_lock:
+            name = record.name.value
+            if self.snapshot is not None and self.snapshot.get(name) is record:
+                self.snapshot[name] = copy.deepcopy(record)
+
+    def log(self, op, name, *args):
+        self.changes += 1
+        if isinstance(self.data, (LazyRecords, SqliteRecords)):
+            self.data.mark_dirty(name)
+        if self.shard_count:
+            self.dirty_shards.add(shard_of(name, self.shard_count))
+        if self.journal is not None:
+            self.journal.append(op, name, args)
+
+    def apply(self, op, name, args):
+        """Replay one journal entry."""
+        if op == "add_record":
+            self.add_record(*args)
+        elif op == "delete":
+            self.delete(name)
+        elif op == "add_tag":
+            self.data[name].note.add_tag(*args)
+        else:
+            getattr(self.data[name], op)(*args)
+
+    def open_journal(self, filename, snapshot_seq=0):
+        """Replay entries newer than the snapshot, then log every further mutation to `filename`."""
+        seq = snapshot_seq
+        entries = 0
+        for entry_seq, op, name, args in Journal.read(filename):
+            if entry_seq > snapshot_seq:
+                self.apply(op, name, args)
+            seq = max(seq, entry_seq)
+            entries += 1
+        self.journal = Journal(filename, seq)
+        # entries left by earlier runs count towards compaction too, or a book
+        # changed a little per run would never be compacted
+        self.journal.entries = entries
+
+    def reindex(self, kind, name, old=None, new=None):
+        if not self.indexed:
+            return
+        index = self.indexes[kind]
+        if old is not None:
+            names = index.get(old)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del index[old]
+        if new is not None:
+            index.setdefault(new, set()).add(name)
+        if kind == "birthday":
+            self.reindex_calendar(name, old, new)
+        elif kind == "phone":
+            self.reindex_directory(name, old, new)
+        elif kind == "email":
+            self.reindex_domains(name, old, new)
+
+    def reindex_domains(self, name, old=None, new=None):
+        if old is not None:
+            entry = (reversed_domain(old), name)
+            position = bisect_left(self.email_domains, entry)
+            if position < len(self.email_domains) and self.email_domains[position] == entry:
+                del self.email_domains[position]
+        if new is not None:
+            insort(self.email_domains, (reversed_domain(new), name))
+
+    def reindex_address(self, name, old=frozenset(), new=frozenset()):
+        if self.indexed:
+            update_postings(self.address_tokens, name, set(old), set(new))
+
+    def reindex_directory(self, name, old=None, new=None):
+        if old is not None:
+            position = bisect_left(self.phone_directory, (old, name))
+            if position < len(self.phone_directory) and self.phone_directory[position] == (old, name):
+                del self.phone_directory[position]
+        if new is not None:
+            insort(self.phone_directory, (new, name))
+
+    def reindex_calendar(self, name, old=None, new=None):
+        if old is not None:
+            entry = (*calendar_key(old), name)
+            position = bisect_left(self.birthday_calendar, entry)
+            if position < len(self.birthday_calendar) and self.birthday_calendar[position] == entry:
+                del self.birthday_calendar[position]
+        if new is not None:
+            insort(self.birthday_calendar, (*calendar_key(new), name))
+
+    def reindex_note(self, name, old=None, new=None):
+        if not self.indexed:
+            return
+        old_trigrams = trigrams(old) if old else set()
+        new_trigrams = trigrams(new) if new else set()
+        update_postings(self.note_trigrams, name, old_trigrams, new_trigrams)
+
+    def index_record(self, record, remove=False):
+        name = record.name.value
+        values = {
+            "phone": [phone.value for phone in record.phones],
+            "email": [email.value for email in record.email],
+            "birthday": [record.birthday.value] if record.birthday else [],
+            "tag": list(record.note.tags) if record.note else [],
+        }
+        for kind, keys in values.items():
+            for key in keys:
+                if remove:
+                    self.reindex(kind, name, old=key)
+                else:
+                    self.reindex(kind, name, new=key)
+        if not self.indexed:
+            return
+        if remove:
+            postings = self.name_trigrams.get(len(name), {})
+            update_postings(postings, name, name_trigrams(name), set())
+            if not postings:
+                self.name_trigrams.pop(len(name), None)
+            update_postings(self.address_tokens, name, record.address_tokens(), set())
+        else:
+            update_postings(self.name_trigrams.setdefault(len(name), {}), name, set(), name_trigrams(name))
+            update_postings(self.address_tokens, name, set(), record.address_tokens())
+        if record.note and isinstance(record.note.value, str):
+            if remove:
+                self.reindex_note(name, old=record.note.value)
+            else:
+                self.reindex_note(name, new=record.note.value)
+
     def add_record(self, record):
-        self.data[record.name.value] = record
+        name = record.name.value
+        if name in self.data:
+            if self.indexed:
+                self.index_record(self.data[name], remove=True)
+        elif self.sorted_names is not None:
+            insort(self.sorted_names, name)
+        self.data[name] = record
+        record.book = self
+        self.index_record(record)
+        self.log("add_record", name, record)
     
+    @timed("find")
     def find(self, name):
         return self.data.get(name)
 
+    def delete(self, name):
+        if name not in self.data:
+            return False
+        self.index_record(self.data.pop(name), remove=True)
+        if self.sorted_names is not None:
+            del self.sorted_names[bisect_left(self.sorted_names, name)]
+        self.log("delete", name)
+        return True
+
+    def names_in_order(self, sort="name"):
+        """Yield contact names sorted by name, by upcoming-in-the-year birthday or
+        by phone number; contacts without that field follow in name order."""
+        if self.sorted_names is None:
+            self.sorted_names = sorted(self.data)
+        if sort == "name":
+            yield from self.sorted_names
+            return
+        if sort not in ("birthday", "phone"):
+            raise ValueError(f"Cannot sort contacts by '{sort}'")
+        self.ensure_indexes()
+        if sort == "birthday":
+            ordered = (name for _, _, name in self.birthday_calendar)
+        else:
+            ordered = (name for _, name in self.phone_directory)
+        seen = set()
+        for name in ordered:
+            if name not in seen:
+                seen.add(name)
+                yield name
+        for name in self.sorted_names:
+            if name not in seen:
+                yield name
+
+    def records_page(self, page=1, size=None, sort="name"):
+        """Yield the records of one page (1-based) in `sort` order; size=None is everything."""
+        start = (page - 1) * size if size else 0
+        if sort == "name":
+            if self.sorted_names is None:
+                self.sorted_names = sorted(self.data)
+            names = iter(self.sorted_names[start:start + size] if size else self.sorted_names)
+        else:
+            names = islice(self.names_in_order(sort), start, start + size if size else None)
+        for name in names:
+            yield self.data[name]
+
     def remove_phone(self, name):
-        if name in self.data:
-            del self.data[name]
+        if self.delete(name):
             print(f"Contact {name} deleted.")
         else:
             print("Contact not found.")
 
+    @timed("save_to_file")
     def save_to_file(self, filename):
-        with open(filename, 'wb') as file:
-            pickle.dump(self.data, file)
-
-    def get_birthdays_per_week(self,threshold=7):
-        birthday_dict = {"Monday": [], "Tuesday": [], "Wednesday": [], "Thursday": [], "Friday": []}
-        today = datetime.today().date()
-
-        for name, record in self.data.items():
-            if record.birthday:
-                birthday_date = datetime.strptime(record.birthday.value, "%d.%m.%Y").date()
-                birthday_this_year = birthday_date.replace(year=today.year)
-
-                if birthday_this_year < today:
-                    birthday_this_year = birthday_this_year.replace(year=today.year + 1)
-
-                delta_days = (birthday_this_year - today).days
-
-                day_of_week = (today + timedelta(days=delta_days)).strftime("%A") if 0 <= delta_days < threshold else None
+        with self.save_lock:
+            self.prepare_save(filename)()
+
+    def prepare_save(self, filename):
+        """Capture what needs saving and return a function that writes it to disk.
+
+        Only the capture must not overlap commands that change the book. Pickle and
+        sharded saves take a copy-on-write snapshot (records edited afterwards are
+        copied first, see Record.touch), so the returned writer can run in another
+        thread while editing goes on. Journal and lazy saves are done here.
+        Callers hold save_lock from the capture until the writer returns.
+        """
+        if not self.dirty and os.path.exists(filename):
+            return lambda: None
+        changes = self.changes
+        if isinstance(self.data, (LazyRecords, SqliteRecords)) or self.journal is not None:
+            if isinstance(self.data, (LazyRecords, SqliteRecords)):
+                self.data.save(filename)
+            else:
+                self.journal.sync()
+                if self.journal.entries >= Journal.COMPACT_AFTER:
+                    self.compact(filename)
+            self.saved_changes = changes
+            return lambda: None
+        shards = self.dirty_shards
+        self.dirty_shards = set()
+        if self.shard_count:
+            snapshot = {name: record for name, record in self.data.items()
+                        if shard_of(name, self.shard_count) in shards}
+            groups = {shard: [] for shard in shards}
+            for name in snapshot:
+                groups[shard_of(name, self.shard_count)].append(name)
+        else:
+            snapshot = dict(self.data)
+        self.snapshot = snapshot
 
-                if day_of_week in ["Saturday", "Sunday"]:
-                    day_of_week = "Monday"
+        def write():
+            # chunks are pickled under snapshot_lock, so touch() cannot copy a
+            # record halfway through; compression and I/O happen outside it
+            try:
+                if self.shard_count:
+                    self.write_shards(filename, {
+                        shard: pickled_chunks(snapshot, names, self.snapshot_lock) for shard, names in groups.items()})
+                else:
+                    write_snapshot(filename, pickled_chunks(snapshot, list(snapshot), self.snapshot_lock))
+            except BaseException:
+                self.dirty_shards |= shards
+                raise
+            finally:
+                self.snapshot = None
+            self.saved_changes = max(self.saved_changes, changes)
+        return write
+
+    def write_shards(self, filename, shards):
+        for shard, chunks in shards.items():
+            write_snapshot(shard_filename(filename, shard), chunks)
+        if read_shard_count(filename) != self.shard_count:
+            # the manifest goes last: until it is replaced, the old shard layout stays readable
+            write_atomically(filename, SHARDED_MAGIC + SHARD_COUNT.pack(self.shard_count))
+            shard = self.shard_count
+            while os.path.exists(shard_filename(filename, shard)):
+                os.remove(shard_filename(filename, shard))
+                shard += 1
+
+    def compact(self, filename):
+        """Fold the journal into a fresh snapshot and start an empty journal."""
+        # the snapshot remembers the last entry it contains, so a crash
+        # before the journal is truncated does not replay entries twice
+        write_snapshot(filename, pickled_chunks(self.data, list(self.data)), seq=self.journal.seq)
+        self.journal.truncate()
+
+    @timed("birthdays_between")
+    def birthdays_between(self, start, end):
+        """Return (date, name) pairs for birthdays from start to end inclusive, in date order.
+
+        Feb 29 birthdays fall on Feb 28 in non-leap years.
+        """
+        if isinstance(self.data, SqliteRecords):
+            return self.data.birthdays_between(start, end)
+        return list(takewhile(lambda item: item[0] <= end, self.upcoming_birthdays(start)))
+
+    def upcoming_birthdays(self, start=None):
+        """Yield (date, name) for every birthday from `start` (default today) on, in date order.
+
+        Endless (year after year) unless the book has no birthdays, so take what is
+        needed with islice/takewhile: the birthday calendar is walked from `start`,
+        so the cost is that of the results consumed. Feb 29 birthdays fall on
+        Feb 28 in non-leap years. The book must not change while iterating.
+        """
+        start = start or datetime.today().date()
+        if isinstance(self.data, SqliteRecords):
+            if not self.data.has_birthdays():
+                return
+            # one query per year of results
+            year_start = start
+            while True:
+                yield from self.data.birthdays_between(year_start, date(year_start.year, 12, 31))
+                year_start = date(year_start.year + 1, 1, 1)
+        self.ensure_indexes()
+        calendar = self.birthday_calendar
+        if not calendar:
+            return
+        year = start.year
+        # (2, 29) sorts after (2, 28), so a Feb 28 start also picks up the Feb 29 birthdays
+        position = bisect_left(calendar, (start.month, start.day))
+        while True:
+            for index in range(position, len(calendar)):
+                month, day, name = calendar[index]
+                if month == 2 and day == 29 and not is_leap(year):
+                    day = 28
+                yield date(year, month, day), name
+            year += 1
+            position = 0
+
+    def next_birthdays(self, count, start=None):
+        """The next `count` (date, name) birthdays from `start` (default today)."""
+        if count < 0:
+            raise ValueError(f"Cannot list {count} birthdays: the count must not be negative")
+        return list(islice(self.upcoming_birthdays(start), count))
+
+    def birthdays_grouped(self, start, end, period="week"):
+        """Yield (first day of the week or month, [(date, name), ...]) for birthdays from start to end inclusive.
+
+        Weeks start on Monday; empty weeks and months are skipped.
+        """
+        if period == "week":
+            key = lambda item: item[0] - timedelta(days=item[0].weekday())
+        elif period == "month":
+            key = lambda item: item[0].replace(day=1)
+        else:
+            raise ValueError(f"Cannot group birthdays by '{period}': use week or month")
+        for group, items in groupby(takewhile(lambda item: item[0] <= end, self.upcoming_birthdays(start)), key):
+            yield group, list(items)
 
-                if day_of_week:
-                    birthday_dict[day_of_week].append(name)
+    def get_birthdays_per_week(self, threshold=7, today=None):
+        """Names with a birthday in the next `threshold` days, grouped by the weekday
+        they are celebrated on (weekend birthdays move to Monday)."""
+        birthday_dict = {"Monday": [], "Tuesday": [], "Wednesday": [], "Thursday": [], "Friday": []}
+        today = today or datetime.today().date()
+        if threshold <= 0:
+            return birthday_dict
 
-        if any(birthday_dict.values()):
-            print(f"Birthdays in the next {threshold} days:")
-            for day, names in birthday_dict.items():
-                if names:
-                    print(f"{day}: {', '.join(names)}")
-        else:
-            print(f"No birthdays in the {threshold} days.")
+        for birthday_date, name in self.birthdays_between(today, today + timedelta(days=threshold - 1)):
+            day_of_week = birthday_date.strftime("%A")
+            if day_of_week in ["Saturday", "Sunday"]:
+                day_of_week = "Monday"
+            birthday_dict[day_of_week].append(name)
+        return birthday_dict
 
     def add_tag_to_note(self, name, tag):
         record = self.find(name)
         if record and record.note:
             record.note.add_tag(tag)
 
+    @timed("search_by_tag")
     def search_by_tag(self, tag):
-        matching_records = []
-        for record in self.data.values():
-            if record.note and tag in record.note.tags:
-                matching_records.append(record)
-        return matching_records
-
+        if isinstance(self.data, SqliteRecords):
+            return [self.data[name] for name in self.data.search_by_tag(tag)]
+        self.ensure_indexes()
+        return [self.data[name] for name in sorted(self.indexes["tag"].get(tag, ()))]
+
+    @timed("search_by_tags")
+    def search_by_tags(self, query):
+        """Boolean tag query, e.g. 'work AND (urgent OR today) NOT done'.
+
+        NOT binds tightest, then AND, then OR; adjacent terms are ANDed.
+        Answered with set operations on the tag index.
+        """
+        self.ensure_indexes()
+        tokens = query.replace("(", " ( ").replace(")", " ) ").split()
+        index = self.indexes["tag"]
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        def take():
+            nonlocal position
+            position += 1
+            return tokens[position - 1]
+
+        def parse_or():
+            names = parse_and()
+            while peek() is not None and peek().upper() == "OR":
+                take()
+                names = names | parse_and()
+            return names
+
+        def parse_and():
+            names = parse_not()
+            while peek() is not None and peek().upper() != "OR" and peek() != ")":
+                if peek().upper() == "AND":
+                    take()
+                names = names & parse_not()
+            return names
+
+        def parse_not():
+            token = peek()
+            if token is None or token == ")" or token.upper() in ("AND", "OR"):
+                raise ValueError(f"Invalid tag query: expected a tag in '{query}'")
+            if token.upper() == "NOT":
+                take()
+                return self.data.keys() - parse_not()
+            take()
+            if token == "(":
+                names = parse_or()
+                if peek() != ")":
+                    raise ValueError(f"Invalid tag query: missing ')' in '{query}'")
+                take()
+                return names
+            return set(index.get(token, ()))
+
+        names = parse_or()
+        if peek() is not None:
+            raise ValueError(f"Invalid tag query: unexpected '{peek()}' in '{query}'")
+        return [self.data[name] for name in sorted(names)]
+
+    @timed("find_by_note")
     def find_by_note(self, pattern):
+        regex = re.compile(pattern, flags=re.IGNORECASE)
+        if isinstance(self.data, SqliteRecords):
+            return self.data.find_by_note(pattern)
+        self.ensure_indexes()
+        required = required_trigrams(pattern)
+        if required:
+            candidates = None
+            for trigram in sorted(required, key=lambda t: len(self.note_trigrams.get(t, ()))):
+                names = self.note_trigrams.get(trigram)
+                if not names:
+                    return []
+                candidates = set(names) if candidates is None else candidates & names
+                if not candidates:
+                    return []
+        else:
+            candidates = self.data.keys()
         matching_contacts = []
-        for name, record in self.data.items():
+        for name in candidates:
+            record = self.data[name]
             try:
-                if record.note and re.search(pattern, record.note.value, flags=re.IGNORECASE):
+                if record.note and regex.search(record.note.value):
                     matching_contacts.append(name)
-            except AttributeError:
-                continue 
-        return matching_contacts
-
-    def find_by_item(self,item):
-        matching_contacts = []
+            except (AttributeError, TypeError):
+                continue
+        return sorted(matching_contacts)
+
+    def find_by_phone_prefix(self, prefix, limit=None):
+        """Yield (phone, name) pairs whose phone starts with `prefix`, in phone order."""
+        if limit is not None and limit < 0:
+            # SQLite would read LIMIT -1 as no limit at all
+            raise ValueError(f"Cannot list {limit} phones: the limit must not be negative")
+        if isinstance(self.data, SqliteRecords):
+            yield from self.data.phones_from(prefix, limit)
+            return
+        self.ensure_indexes()
+        directory = self.phone_directory
+        position = bisect_left(directory, (prefix,))
+        found = 0
+        while position < len(directory) and (limit is None or found < limit):
+            phone, name = directory[position]
+            if not phone.startswith(prefix):
+                break
+            yield phone, name
+            found += 1
+            position += 1
+
+    @timed("find_by_domain")
+    def find_by_domain(self, domain):
+        """Sorted names with an e-mail address at `domain` or one of its subdomains."""
+        key = reversed_domain(domain.lstrip("@"))
+        if isinstance(self.data, SqliteRecords):
+            return self.data.find_by_domain(key)
+        self.ensure_indexes()
+        names = set()
+        position = bisect_left(self.email_domains, (key,))
+        while position < len(self.email_domains):
+            entry_domain, name = self.email_domains[position]
+            if not entry_domain.startswith(key):
+                break
+            if len(entry_domain) == len(key) or entry_domain[len(key)] == ".":
+                names.add(name)
+            position += 1
+        return sorted(names)
+
+    @timed("find_by_address")
+    def find_by_address(self, words):
+        """Sorted names whose addresses contain every word of `words`, ignoring case and accents."""
+        tokens = address_tokens(words)
+        if not tokens:
+            return []
+        if isinstance(self.data, SqliteRecords):
+            return self.data.find_by_address(tokens)
+        self.ensure_indexes()
+        postings = sorted((self.address_tokens.get(token, set()) for token in tokens), key=len)
+        names = set(postings[0])
+        for other in postings[1:]:
+            names &= other
+            if not names:
+                break
+        return sorted(names)
+
+    @timed("find_similar")
+    def find_similar(self, name, limit=5, candidates=50):
+        """Return up to `limit` (name, score) pairs for the contact names closest to `name`.
+
+        Contact names are searched one length at a time, nearest the query's
+        length first, until a length cannot beat the names already found:
+        fuzz.ratio counts the letters two names have in common. Names of each
+        length are collected from the query's rarest trigrams (see
+        SIMILAR_EDITS) and only the `candidates` sharing the most trigrams
+        with it are scored. At most SIMILAR_WALK_BUDGET posting entries are
+        walked per call.
+        """
+        if limit < 0:
+            raise ValueError(f"Cannot list {limit} similar contacts: the count must not be negative")
+        self.ensure_indexes()
+        from fuzzywuzzy import fuzz
+        query = name_trigrams(name)
+        lowered = name.lower()
+        letters = Counter(lowered)
+        budget = self.SIMILAR_WALK_BUDGET
+        found = []
+
+        def rank(match):
+            return -match[1], match[0]
+
+        def beaten(other, common, length):
+            """Whether `other`, with `common` letters and `length`, cannot make the results."""
+            bound = round(200 * common / (len(lowered) + length))
+            return len(found) == limit and (not found or rank((other, bound)) > rank(found[-1]))
+
+        for length in sorted(self.name_trigrams, key=lambda length: (abs(length - len(name)), length)):
+            if beaten("", min(length, len(lowered)), length) or budget <= 0:
+                break
+            shortlist, budget = similar_shortlist(self.name_trigrams[length], query, 3 * self.SIMILAR_EDITS + 1,
+                                                  candidates, budget)
+            for other in shortlist:
+                other_lowered = other.lower()
+                common = sum(min(count, other_lowered.count(letter)) for letter, count in letters.items())
+                if beaten(other, common, len(other_lowered)):
+                    continue
+                found.append((other, fuzz.ratio(lowered, other_lowered)))
+                found.sort(key=rank)
+                del found[limit:]
+        return found
+
+    @timed("find_duplicates")
+    def find_duplicates(self, threshold=85, workers=None):
+        """Return (score, name, other, reasons) merge proposals, best first.
+
+        Only contacts sharing a blocking key (see blocking_keys) are compared;
+        their names are scored with fuzz.token_sort_ratio in a process pool.
+        """
+        blocks = {}
         for name, record in self.data.items():
-            if name == item:
-                matching_contacts.append(str(record))
-
-            if record.birthday:
-                if record.birthday.value == item:
-                    matching_contacts.append(str(record))
-
-            if record.email:
-                for email in record.email:
-                    if email.value == item:
-                        matching_contacts.append(str(record))
-
-            if record.phones:
-                if record.find_phone(item):
-                    matching_contacts.append(str(record))
+            for key in blocking_keys(record):
+                blocks.setdefault(key, []).append(name)
+        reasons = {}
+        for (kind, _), names in blocks.items():
+            if len(names) > DEDUPE_MAX_BLOCK:
+                continue
+            names.sort()
+            for i, name in enumerate(names):
+                for other in names[i + 1:]:
+                    reasons.setdefault((name, other), set()).add(kind)
+        triples = [(name, other, bool(kinds - {"name"})) for (name, other), kinds in reasons.items()]
+        if len(triples) <= DEDUPE_CHUNK_SIZE:
+            workers = 1
+        proposals = []
+        for results in pooled(score_pairs, chunked(triples, DEDUPE_CHUNK_SIZE), workers):
+            for name, other, score in results:
+                if score >= threshold:
+                    proposals.append((score, name, other, sorted(reasons[name, other])))
+        proposals.sort(key=lambda proposal: (-proposal[0], proposal[1], proposal[2]))
+        return proposals
+
+    def merge_duplicates(self, proposals):
+        """Merge every group of contacts linked by `proposals` into its most complete record.
+
+        Returns (kept name, [merged names]) per group.
+        """
+        # union-find over the proposed pairs
+        parent = {}
+
+        def root(name):
+            parent.setdefault(name, name)
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        for _, name, other, _ in proposals:
+            parent[root(other)] = root(name)
+        groups = {}
+        for name in list(parent):
+            groups.setdefault(root(name), []).append(name)
+        merged = []
+        for names in groups.values():
+            records = [self.data[name] for name in names if name in self.data]
+            if len(records) < 2:
+                continue
+            records.sort(key=lambda record: (-record.completeness(), record.name.value))
+            keep, others = records[0], records[1:]
+            for other in others:
+                keep.merge(other)
+                self.delete(other.name.value)
+            merged.append((keep.name.value, [other.name.value for other in others]))
+        merged.sort()
+        return merged
+
+    @timed("find_by_item")
+    def find_by_item(self,item):
+        if isinstance(self.data, SqliteRecords):
+            names = self.data.find_by_item(item)
+        else:
+            self.ensure_indexes()
+            names = [item] if item in self.data else []
+            for kind in ("birthday", "email", "phone"):
+                names.extend(self.indexes[kind].get(item, ()))
+        matching_contacts = [str(self.data[name]) for name in dict.fromkeys(names)]
         if matching_contacts:
             for i in matching_contacts:
                 print(i)
+        return matching_contacts
   
-def load_address_book_from_file(filename):
+class BookUnpickler(pickle.Unpickler):
+    # Books saved by `python main.py` reference classes as __main__.Record etc.;
+    # resolve them against this module so the file loads when main is imported too.
+    def find_class(self, module, name):
+        if module == "__main__":
+            module = __name__
+        return super().find_class(module, name)
+
+
+SHARDED_MAGIC = b"ABOOK\x00\x02\x00"
+SHARD_COUNT = struct.Struct("<I")
+DEFAULT_SHARDS = 16
+
+
+def shard_of(name, shard_count):
+    # crc32 rather than hash(): str hashes are salted per process
+    return zlib.crc32(name.encode()) % shard_count
+
+
+def shard_filename(filename, shard):
+    return f"{filename}.{shard:03d}"
+
+
+def read_shard_count(filename):
+    """Number of shards if `filename` is a sharded book's manifest, else 0."""
     try:
         with open(filename, 'rb') as file:
-            data = pickle.load(file)
+            # one byte more than a manifest holds: a longer file is not a manifest,
+            # e.g. a snapshot whose magic got damaged into the sharded one
+            header = file.read(len(SHARDED_MAGIC) + SHARD_COUNT.size + 1)
+    except (FileNotFoundError, TypeError):
+        return 0
+    if len(header) != len(SHARDED_MAGIC) + SHARD_COUNT.size or not header.startswith(SHARDED_MAGIC):
+        return 0
+    return SHARD_COUNT.unpack_from(header, len(SHARDED_MAGIC))[0]
+
+
+def write_atomically(filename, payload):
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'wb') as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+def read_shard(filename):
+    """(name, record) pairs of one shard file; a missing file is an empty shard.
+
+    Runs in load_shards' thread pool: file reads and zlib/lzma decompression
+    release the GIL, so those parts of loading use every core.
+    """
+    try:
+        with open(filename, 'rb') as file:
+            payload = file.read()
+    except FileNotFoundError:
+        return []
+    file = io.BytesIO(payload)
+    header = read_snapshot_header(file, filename)
+    if header is not None:
+        compression, _ = header
+        return [(record.name.value, record) for record in read_snapshot_records(file, filename, compression)]
+    if payload:
+        return list(load_legacy_pickle(file, filename)[0].items())
+    return []
+
+
+def load_shards(filename, shard_count, workers=None):
+    """Read and decode all shard files concurrently and return their records merged into one dict."""
+    from concurrent.futures import ThreadPoolExecutor
+    data = {}
+    filenames = [shard_filename(filename, shard) for shard in range(shard_count)]
+    with ThreadPoolExecutor(max_workers=workers or min(shard_count, os.cpu_count() or 1)) as pool:
+        for records in pool.map(read_shard, filenames):
+            data.update(records)
+    return data
+
+
+def is_indexed_file(filename):
+    try:
+        with open(filename, 'rb') as file:
+            return file.read(len(INDEXED_MAGIC)) == INDEXED_MAGIC
+    except (FileNotFoundError, TypeError):
+        return False
+
+
+class Journal:
+    """Append-only log of (seq, op, name, args) pickles kept next to a snapshot file."""
+
+    COMPACT_AFTER = 1000
+
+    def __init__(self, filename, seq=0):
+        self.filename = filename
+        self.seq = seq
+        self.entries = 0
+        self.file = open(filename, 'ab')
+
+    def append(self, op, name, args):
+        self.seq += 1
+        self.file.write(pickle.dumps((self.seq, op, name, args)))
+        # hand every entry to the OS right away; sync() makes it durable
+        self.file.flush()
+        self.entries += 1
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def truncate(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.sync()
+        self.entries = 0
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def read(filename):
+        """Yield complete entries; a torn entry at the end (crash mid-write) is cut off."""
+        try:
+            file = open(filename, 'r+b')
+        except FileNotFoundError:
+            return
+        with file:
+            good = 0
+            while True:
+                try:
+                    # a fresh unpickler per entry: each entry has its own memo
+                    entry = BookUnpickler(file).load()
+                except EOFError:
+                    break
+                except Exception:
+                    file.truncate(good)
+                    break
+                good = file.tell()
+                yield entry
+
+
+INDEXED_MAGIC = b"ABOOK\x00\x01\x00"
+# magic, record count, offset of the entry list, offset of the name-sorted entry table
+INDEXED_HEADER = struct.Struct("<8sQQQ")
+ENTRY_NAME = struct.Struct("<I")
+ENTRY_LOCATION = struct.Struct("<QI")
+TABLE_SLOT = struct.Struct("<Q")
+
+
+def write_indexed_file(filename, items):
+    """Write (name, pickled record) pairs in the indexed format, atomically.
+
+    Layout: header | record pickles | entries (name, record offset, length) in
+    book order | table of entry offsets sorted by name, for binary search.
+    """
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'wb') as file:
+        file.write(bytes(INDEXED_HEADER.size))
+        locations = []
+        for name, payload in items:
+            locations.append((name, file.tell(), len(payload)))
+            file.write(payload)
+        entries_offset = file.tell()
+        entry_offsets = []
+        for name, offset, length in locations:
+            entry_offsets.append(file.tell())
+            encoded = name.encode()
+            file.write(ENTRY_NAME.pack(len(encoded)) + encoded + ENTRY_LOCATION.pack(offset, length))
+        table_offset = file.tell()
+        for position in sorted(range(len(locations)), key=lambda i: locations[i][0]):
+            file.write(TABLE_SLOT.pack(entry_offsets[position]))
+        file.seek(0)
+        file.write(INDEXED_HEADER.pack(INDEXED_MAGIC, len(locations), entries_offset, table_offset))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+class LazyRecords(MutableMapping):
+    """Records of an indexed book file, unpickled only when a name is looked up.
+
+    The file is mmap'ed; names are found by binary search over the sorted
+    table. Materialized records are held weakly until a mutation marks them
+    dirty, so streaming over the book does not keep every record in memory.
+    """
+
+    def __init__(self, filename, book):
+        self.book = book
+        self.cache = weakref.WeakValueDictionary()
+        self.open(filename)
+
+    def open(self, filename):
+        self.dirty = {}
+        self.added = {}
+        self.deleted = set()
+        self.count = 0
+        self.file = self.map = None
+        if filename is None or not os.path.exists(filename):
+            return
+        self.file = open(filename, 'rb')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            return
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.entries_offset, self.table_offset = INDEXED_HEADER.unpack_from(self.map)
+        if magic != INDEXED_MAGIC:
+            raise ValueError(f"{filename} is not an indexed address book file")
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        if self.file is not None:
+            self.file.close()
+
+    def entry(self, offset):
+        (size,) = ENTRY_NAME.unpack_from(self.map, offset)
+        offset += ENTRY_NAME.size
+        name = self.map[offset:offset + size].decode()
+        record_offset, length = ENTRY_LOCATION.unpack_from(self.map, offset + size)
+        return name, record_offset, length, offset + size + ENTRY_LOCATION.size
+
+    def locate(self, name):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            (entry_offset,) = TABLE_SLOT.unpack_from(self.map, self.table_offset + middle * TABLE_SLOT.size)
+            entry_name, record_offset, length, _ = self.entry(entry_offset)
+            if entry_name < name:
+                low = middle + 1
+            elif entry_name > name:
+                high = middle
+            else:
+                return record_offset, length
+        return None
+
+    def stored_names(self):
+        offset = self.entries_offset if self.count else 0
+        for _ in range(self.count):
+            name, _, _, offset = self.entry(offset)
+            yield name
+
+    def mark_dirty(self, name):
+        record = self.cache.get(name)
+        if record is not None:
+            self.dirty[name] = record
+
+    def __getitem__(self, name):
+        record = self.dirty.get(name)
+        if record is None:
+            record = self.cache.get(name)
+        if record is not None:
+            return record
+        location = None if name in self.deleted else self.locate(name)
+        if location is None:
+            raise KeyError(name)
+        offset, length = location
+        record = BookUnpickler(io.BytesIO(self.map[offset:offset + length])).load()
+        record.book = self.book
+        self.cache[name] = record
+        return record
+
+    def __setitem__(self, name, record):
+        self.dirty[name] = record
+        self.cache[name] = record
+        if name in self.deleted:
+            self.deleted.discard(name)
+        elif self.locate(name) is None:
+            self.added[name] = None
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.dirty.pop(name, None)
+        self.cache.pop(name, None)
+        if name in self.added:
+            del self.added[name]
+        else:
+            self.deleted.add(name)
+
+    def __contains__(self, name):
+        if name in self.dirty or name in self.added:
+            return True
+        return name not in self.deleted and self.locate(name) is not None
+
+    def __iter__(self):
+        for name in self.stored_names():
+            if name not in self.deleted:
+                yield name
+        yield from list(self.added)
+
+    def __len__(self):
+        return self.count - len(self.deleted) + len(self.added)
+
+    def save(self, filename):
+        def items():
+            for name in self:
+                record = self.dirty.get(name)
+                if record is not None:
+                    yield name, pickle.dumps(record)
+                else:
+                    offset, length = self.locate(name)
+                    yield name, self.map[offset:offset + length]
+
+        write_indexed_file(filename, items())
+        self.close()
+        self.open(filename)
+
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    birthday TEXT,
+    birthday_key TEXT
+);
+CREATE TABLE IF NOT EXISTS phones (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    phone TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS emails (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    domain TEXT
+);
+CREATE TABLE IF NOT EXISTS addresses (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    address TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notes (
+    contact_id INTEGER PRIMARY KEY REFERENCES contacts(id) ON DELETE CASCADE,
+    note TEXT,
+    folded TEXT
+);
+CREATE TABLE IF NOT EXISTS address_words (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    word TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts(birthday);
+CREATE INDEX IF NOT EXISTS contacts_birthday_key ON contacts(birthday_key, name);
+CREATE INDEX IF NOT EXISTS phones_contact ON phones(contact_id);
+CREATE INDEX IF NOT EXISTS phones_phone ON phones(phone);
+CREATE INDEX IF NOT EXISTS emails_contact ON emails(contact_id);
+CREATE INDEX IF NOT EXISTS emails_email ON emails(email);
+CREATE INDEX IF NOT EXISTS emails_domain ON emails(domain);
+CREATE INDEX IF NOT EXISTS addresses_contact ON addresses(contact_id);
+CREATE INDEX IF NOT EXISTS address_words_contact ON address_words(contact_id);
+CREATE INDEX IF NOT EXISTS address_words_word ON address_words(word);
+CREATE INDEX IF NOT EXISTS tags_contact ON tags(contact_id);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags(tag);
+"""
+# contact_id -> values tables, in the order their rows are stored
+SQLITE_LISTS = (("phones", "phone"), ("emails", "email"), ("addresses", "address"), ("tags", "tag"))
+
+
+def is_sqlite_file(filename):
+    try:
+        with open(filename, 'rb') as file:
+            return file.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except (FileNotFoundError, TypeError):
+        return False
+
+
+def restore(cls, **state):
+    """Rebuild a field or record from stored values without re-validating them, as unpickling does."""
+    obj = cls.__new__(cls)
+    obj.__setstate__(state)
+    return obj
+
+
+def sqlite_regexp(pattern, text):
+    try:
+        return re.search(pattern, text, flags=re.IGNORECASE) is not None
+    except TypeError:
+        return False
+
+
+class SqliteRecords(MutableMapping):
+    """Records kept in normalized SQLite tables and built from rows on lookup.
+
+    Like LazyRecords, materialized records are cached weakly and held strongly
+    only while dirty; dirty records are written to the database before every
+    query and committed by save(). AddressBook pushes its indexed queries down
+    to the methods below instead of building in-memory indexes.
+
+    With `target` set, the database is a temporary file that save() renames
+    to `target`, which is how a pickle book is migrated.
+    """
+
+    # contacts read per round of queries when iterating over all records
+    BATCH = 1000
+
+    def __init__(self, path, book, target=None):
+        import sqlite3
+        self.book = book
+        self.path = path
+        self.target = target
+        self.cache = weakref.WeakValueDictionary()
+        self.dirty = {}
+        # the autosave thread and server executor threads share the connection
+        self.lock = threading.RLock()
+        self.open()
+
+    def open(self):
+        import sqlite3
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.create_function("regexp", 2, sqlite_regexp, deterministic=True)
+        self.connection.create_function("reversed_domain", 1, reversed_domain, deterministic=True)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(emails)")]
+        # a book written before e-mail domains and address words were stored
+        upgrade = bool(columns) and "domain" not in columns
+        if upgrade:
+            self.connection.execute("ALTER TABLE emails ADD COLUMN domain TEXT")
+            self.connection.execute("UPDATE emails SET domain = reversed_domain(email)")
+        self.connection.executescript(SQLITE_SCHEMA)
+        if upgrade:
+            words = {}
+            for contact_id, address in self.connection.execute("SELECT contact_id, address FROM addresses"):
+                words.setdefault(contact_id, set()).update(address_tokens(address))
+            self.connection.executemany(
+                "INSERT INTO address_words (contact_id, word) VALUES (?, ?)",
+                [(contact_id, word) for contact_id, tokens in words.items() for word in tokens])
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def contact_id(self, name):
+        row = self.connection.execute("SELECT id FROM contacts WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def build(self, name, birthday, note, lists):
+        state = {
+            "name": restore(Name, value=name),
+            "phones": [restore(Phone, value=phone) for phone in lists["phones"]],
+            "email": [restore(Email, value=email) for email in lists["emails"]],
+            "birthday": restore(Birthday, value=birthday) if birthday else None,
+            "note": restore(Note, value=note[0], tags=lists["tags"]) if note else None,
+            "address": [restore(Address, value=address) for address in lists["addresses"]],
+        }
+        record = restore(Record, **state)
+        record.book = self.book
+        self.cache[name] = record
+        return record
+
+    def load(self, name):
+        row = self.connection.execute(
+            "SELECT id, birthday FROM contacts WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        contact_id, birthday = row
+        lists = {}
+        for table, column in SQLITE_LISTS:
+            lists[table] = [value for (value,) in self.connection.execute(
+                f"SELECT {column} FROM {table} WHERE contact_id = ? ORDER BY position", (contact_id,))]
+        note = self.connection.execute("SELECT note FROM notes WHERE contact_id = ?", (contact_id,)).fetchone()
+        return self.build(name, birthday, note, lists)
+
+    def write(self, record):
+        name = record.name.value
+        birthday = record.birthday.value if record.birthday else None
+        birthday_key = "%02d-%02d" % calendar_key(birthday) if birthday else None
+        contact_id = self.contact_id(name)
+        if contact_id is None:
+            contact_id = self.connection.execute(
+                "INSERT INTO contacts (name, birthday, birthday_key) VALUES (?, ?, ?)",
+                (name, birthday, birthday_key)).lastrowid
+        else:
+            self.connection.execute(
+                "UPDATE contacts SET birthday = ?, birthday_key = ? WHERE id = ?", (birthday, birthday_key, contact_id))
+            for table in ("phones", "emails", "addresses", "address_words", "tags", "notes"):
+                self.connection.execute(f"DELETE FROM {table} WHERE contact_id = ?", (contact_id,))
+        values = {
+            "phones": [phone.value for phone in record.phones],
+            "emails": [email.value for email in record.email],
+            "addresses": [address.value for address in record.address],
+            "tags": list(record.note.tags) if record.note else [],
+        }
+        for table, column in SQLITE_LISTS:
+            self.connection.executemany(
+                f"INSERT INTO {table} (contact_id, position, {column}) VALUES (?, ?, ?)",
+                [(contact_id, position, value) for position, value in enumerate(values[table])])
+        self.connection.execute("UPDATE emails SET domain = reversed_domain(email) WHERE contact_id = ?", (contact_id,))
+        self.connection.executemany(
+            "INSERT INTO address_words (contact_id, word) VALUES (?, ?)",
+            [(contact_id, word) for word in record.address_tokens()])
+        if record.note:
+            note = record.note.value
+            folded = note.translate(CASE_FOLDS).lower() if isinstance(note, str) else None
+            self.connection.execute(
+                "INSERT INTO notes (contact_id, note, folded) VALUES (?, ?, ?)", (contact_id, note, folded))
+
+    def flush(self):
+        with self.lock:
+            while self.dirty:
+                self.write(self.dirty.popitem()[1])
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            self.flush()
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def save(self, filename):
+        with self.lock:
+            self.flush()
+            self.connection.commit()
+            if self.target is not None:
+                self.close()
+                os.replace(self.path, self.target)
+                self.path, self.target = self.target, None
+                self.open()
+
+    def mark_dirty(self, name):
+        record = self.cache.get(name)
+        if record is not None:
+            self.dirty[name] = record
+
+    def __getitem__(self, name):
+        record = self.dirty.get(name)
+        if record is None:
+            record = self.cache.get(name)
+        if record is not None:
+            return record
+        with self.lock:
+            return self.load(name)
+
+    def __setitem__(self, name, record):
+        self.dirty[name] = record
+        self.cache[name] = record
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        with self.lock:
+            self.dirty.pop(name, None)
+            self.cache.pop(name, None)
+            self.connection.execute("DELETE FROM contacts WHERE name = ?", (name,))
+
+    def __contains__(self, name):
+        if name in self.dirty:
+            return True
+        with self.lock:
+            return self.contact_id(name) is not None
+
+    def __iter__(self):
+        for (name,) in self.query("SELECT name FROM contacts ORDER BY id"):
+            yield name
+
+    def __len__(self):
+        return self.query("SELECT COUNT(*) FROM contacts")[0][0]
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+    def items(self):
+        """Yield all (name, record) pairs, reading BATCH contacts at a time with one
+        query per table, so only the batch and the records kept by the caller are in memory."""
+        empty = {name: [] for name, _ in SQLITE_LISTS}
+        last_id = 0
+        while True:
+            with self.lock:
+                self.flush()
+                contacts = self.connection.execute(
+                    "SELECT id, name, birthday FROM contacts WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.BATCH)).fetchall()
+                if not contacts:
+                    return
+                first_id, last_id = contacts[0][0], contacts[-1][0]
+                lists = {}
+                for table, column in SQLITE_LISTS:
+                    for contact_id, value in self.connection.execute(
+                            f"SELECT contact_id, {column} FROM {table} WHERE contact_id BETWEEN ? AND ?"
+                            " ORDER BY contact_id, position", (first_id, last_id)):
+                        lists.setdefault(contact_id, {name: [] for name, _ in SQLITE_LISTS})[table].append(value)
+                notes = dict(self.connection.execute(
+                    "SELECT contact_id, note FROM notes WHERE contact_id BETWEEN ? AND ?", (first_id, last_id)))
+            for contact_id, name, birthday in contacts:
+                record = self.cache.get(name)
+                if record is None:
+                    note = (notes[contact_id],) if contact_id in notes else None
+                    record = self.build(name, birthday, note, lists.get(contact_id, empty))
+                yield name, record
+
+    def find_by_item(self, item):
+        return [name for (name,) in self.query(
+            "SELECT name FROM contacts WHERE name = :item"
+            " UNION ALL SELECT name FROM contacts WHERE birthday = :item"
+            " UNION ALL SELECT c.name FROM emails e JOIN contacts c ON c.id = e.contact_id WHERE e.email = :item"
+            " UNION ALL SELECT c.name FROM phones p JOIN contacts c ON c.id = p.contact_id WHERE p.phone = :item",
+            {"item": item})]
+
+    def search_by_tag(self, tag):
+        return [name for (name,) in self.query(
+            "SELECT DISTINCT c.name FROM tags t JOIN contacts c ON c.id = t.contact_id WHERE t.tag = ? ORDER BY c.name",
+            (tag,))]
+
+    def find_by_note(self, pattern):
+        conditions = ["regexp(?, n.note)"]
+        parameters = [pattern]
+        for trigram in sorted(required_trigrams(pattern)):
+            # the folded column is lower-cased like the trigrams, so LIKE can rule rows out cheaply
+            conditions.insert(0, "n.folded LIKE ? ESCAPE '\\'")
+            parameters.insert(0, "%" + re.sub(r"([\\%_])", r"\\\1", trigram) + "%")
+        return [name for (name,) in self.query(
+            "SELECT c.name FROM notes n JOIN contacts c ON c.id = n.contact_id WHERE "
+            + " AND ".join(conditions) + " ORDER BY c.name", parameters)]
+
+    def find_by_domain(self, key):
+        """Names with an e-mail address whose reversed domain is `key` or below it."""
+        # '/' follows '.' in ASCII, so the range holds exactly the subdomains
+        return [name for (name,) in self.query(
+            "SELECT DISTINCT c.name FROM emails e JOIN contacts c ON c.id = e.contact_id"
+            " WHERE e.domain = ? OR (e.domain > ? AND e.domain < ?) ORDER BY c.name",
+            (key, key + ".", key + "/"))]
+
+    def find_by_address(self, tokens):
+        """Names with every one of the address words `tokens`."""
+        words = " INTERSECT ".join("SELECT contact_id FROM address_words WHERE word = ?" for _ in tokens)
+        return [name for (name,) in self.query(
+            f"SELECT name FROM contacts WHERE id IN ({words}) ORDER BY name", sorted(tokens))]
+
+    def birthdays_between(self, start, end):
+        result = []
+        for year in range(start.year, end.year + 1):
+            first = max(start, date(year, 1, 1))
+            last = min(end, date(year, 12, 31))
+            upper = (last.month, last.day + 1)
+            if upper == (2, 29) and not is_leap(year):
+                upper = (2, 30)
+            rows = self.query(
+                "SELECT birthday_key, name FROM contacts WHERE birthday_key >= ? AND birthday_key < ?"
+                " ORDER BY birthday_key, name", ("%02d-%02d" % (first.month, first.day), "%02d-%02d" % upper))
+            for key, name in rows:
+                month, day = map(int, key.split("-"))
+                if month == 2 and day == 29 and not is_leap(year):
+                    day = 28
+                result.append((date(year, month, day), name))
+        return result
+
+    def has_birthdays(self):
+        return bool(self.query("SELECT 1 FROM contacts WHERE birthday_key IS NOT NULL LIMIT 1"))
+
+    def phones_from(self, prefix, limit=None):
+        sql = "SELECT p.phone, c.name FROM phones p JOIN contacts c ON c.id = p.contact_id WHERE p.phone >= ?"
+        parameters = [prefix]
+        if prefix:
+            sql += " AND p.phone < ?"
+            parameters.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        sql += " ORDER BY p.phone, c.name"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        return self.query(sql, parameters)
+
+
+class CorruptBookError(ValueError):
+    """A book file that is truncated, fails its checksums or cannot be unpickled."""
+
+
+SNAPSHOT_MAGIC = b"ABOOK\x00\x03\x00"
+SNAPSHOT_VERSION = 1
+# magic, format version, compression, sequence number of the last journal entry included
+SNAPSHOT_HEADER = struct.Struct("<8sBBQ")
+# stored (compressed) length, record count, crc32 of the stored bytes; a
+# zero length marks the end, with the total record count
+CHUNK_HEADER = struct.Struct("<III")
+SNAPSHOT_CHUNK = 1000
+COMPRESSIONS = ("none", "zlib", "lzma")
+
+
+def compress(raw, compression):
+    if compression == "zlib":
+        return zlib.compress(raw, 6)
+    if compression == "lzma":
+        import lzma
+        return lzma.compress(raw, preset=1)
+    return raw
+
+
+def decompress(stored, compression):
+    if compression == "zlib":
+        return zlib.decompress(stored)
+    if compression == "lzma":
+        import lzma
+        return lzma.decompress(stored)
+    return stored
+
+
+def pickled_chunks(records, names, lock=None):
+    """Yield (count, pickled list of records) for runs of SNAPSHOT_CHUNK names.
+
+    Each run is looked up and pickled under `lock`, see AddressBook.prepare_save.
+    """
+    for start in range(0, len(names), SNAPSHOT_CHUNK):
+        batch = names[start:start + SNAPSHOT_CHUNK]
+        with lock or nullcontext():
+            raw = pickle.dumps([records[name] for name in batch])
+        yield len(batch), raw
+
+
+def write_snapshot(filename, chunks, seq=0, compression=None):
+    """Stream (count, pickled records) chunks to `filename` in the snapshot format, atomically.
+
+    Layout: header | (chunk header, compressed pickle) per chunk | end marker.
+    Compression is ADDRESS_BOOK_COMPRESSION (none, zlib or lzma), zlib by default.
+    """
+    compression = compression or os.environ.get("ADDRESS_BOOK_COMPRESSION", "zlib")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}': use one of {', '.join(COMPRESSIONS)}")
+    temp_filename = filename + ".tmp"
+    total = 0
+    with open(temp_filename, 'wb') as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, COMPRESSIONS.index(compression), seq))
+        for count, raw in chunks:
+            stored = compress(raw, compression)
+            file.write(CHUNK_HEADER.pack(len(stored), count, zlib.crc32(stored)))
+            file.write(stored)
+            total += count
+        file.write(CHUNK_HEADER.pack(0, total, 0))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+def read_snapshot_header(file, filename):
+    """(compression, seq) of a snapshot file, or None (file rewound) for other formats."""
+    header = file.read(SNAPSHOT_HEADER.size)
+    if not header.startswith(SNAPSHOT_MAGIC):
+        file.seek(0)
+        return None
+    if len(header) < SNAPSHOT_HEADER.size:
+        raise CorruptBookError(f"{filename} is truncated: incomplete header")
+    _, version, compression, seq = SNAPSHOT_HEADER.unpack(header)
+    if version != SNAPSHOT_VERSION or compression >= len(COMPRESSIONS):
+        raise CorruptBookError(f"{filename} uses snapshot format {version}, which this version cannot read")
+    return COMPRESSIONS[compression], seq
+
+
+def read_snapshot_records(file, filename, compression):
+    """Yield the records of a snapshot one chunk at a time, verifying every chunk."""
+    count = 0
+    chunk = 0
+    while True:
+        header = file.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size:
+            raise CorruptBookError(f"{filename} is truncated after {count} contacts")
+        length, records, checksum = CHUNK_HEADER.unpack(header)
+        if length == 0:
+            if checksum != 0:
+                raise CorruptBookError(f"{filename} is corrupted: damaged end marker")
+            if records != count:
+                raise CorruptBookError(f"{filename} should hold {records} contacts but has {count}")
+            return
+        chunk += 1
+        stored = file.read(length)
+        if len(stored) < length:
+            raise CorruptBookError(f"{filename} is truncated in chunk {chunk}")
+        if zlib.crc32(stored) != checksum:
+            raise CorruptBookError(f"{filename} is corrupted: checksum mismatch in chunk {chunk}")
+        try:
+            batch = BookUnpickler(io.BytesIO(decompress(stored, compression))).load()
+        except Exception as e:
+            raise CorruptBookError(f"{filename} is corrupted: chunk {chunk} cannot be read ({e})") from e
+        if len(batch) != records:
+            raise CorruptBookError(f"{filename} is corrupted: chunk {chunk} should hold {records} contacts")
+        count += records
+        yield from batch
+
+
+def check_legacy_record(name, record):
+    """Raise ValueError unless `record` has the shape of a contact: a legacy pickle
+    has no checksum, so damage can turn any value into one of another type."""
+    def fields_ok(items, cls):
+        return isinstance(items, list) and all(type(item) is cls and isinstance(item.value, str) for item in items)
+
+    if not (isinstance(record, Record) and isinstance(name, str)
+            and type(record.name) is Name and record.name.value == name
+            and fields_ok(record.phones, Phone) and fields_ok(record.email, Email) and fields_ok(record.address, Address)
+            and (record.birthday is None or fields_ok([record.birthday], Birthday))
+            and (record.note is None or type(record.note) is Note and isinstance(record.note.tags, dict))):
+        raise ValueError(f"contact {name!r} is damaged")
+
+
+def load_legacy_pickle(file, filename, journal=False):
+    """(name -> record dict, journal seq) from a book saved as one pickle; an empty file is an empty book."""
+    if not file.read(1):
+        return {}, 0
+    file.seek(0)
+    try:
+        data = BookUnpickler(file).load()
+        seq = 0
+        if journal:
+            try:
+                seq = BookUnpickler(file).load()
+            except EOFError:
+                pass
+        if not isinstance(data, dict) or not isinstance(seq, int):
+            raise pickle.UnpicklingError("not an address book")
+        for name, record in data.items():
+            check_legacy_record(name, record)
+    except Exception as e:
+        # damaged pickles fail in many ways: bad opcodes, huge lengths, unknown classes
+        raise CorruptBookError(f"{filename} is truncated or corrupted ({e or 'unexpected end of file'})") from e
+    return data, seq
+
+
+@timed("load_address_book_from_file")
+def load_address_book_from_file(filename, journal=False, lazy=False, shards=0, sqlite=False):
+    """Load a book. Files in the indexed format are always opened lazily; with
+    lazy=True a pickle file is converted to that format on the next save.
+    Sharded books are always loaded from their shards; with shards=N the book
+    is (re)written as N shard files on the next save. SQLite books are always
+    opened in place; with sqlite=True a pickle file is migrated to SQLite on
+    the next save."""
+    if journal and lazy:
+        raise ValueError("Journal storage keeps pickle snapshots and cannot be combined with lazy loading")
+    if shards and (journal or lazy):
+        raise ValueError("Sharded storage cannot be combined with journal or lazy storage")
+    if sqlite and (journal or lazy or shards):
+        raise ValueError("SQLite storage cannot be combined with journal, lazy or sharded storage")
+    if is_sqlite_file(filename):
+        if journal or lazy or shards:
+            raise ValueError(f"{filename} is a SQLite book and cannot be opened with another storage")
+        address_book = AddressBook()
+        address_book.data = SqliteRecords(filename, address_book)
+        address_book.indexed = False
+        return address_book
+    stored_shards = read_shard_count(filename)
+    if stored_shards and (journal or lazy or sqlite):
+        raise ValueError(f"{filename} is a sharded book and cannot be opened with journal, lazy or SQLite storage")
+    if stored_shards:
+        address_book = AddressBook()
+        for record in load_shards(filename, stored_shards).values():
+            address_book.add_record(record)
+        address_book.shard_count = shards or stored_shards
+        address_book.mark_saved()
+        if address_book.shard_count != stored_shards:
+            address_book.dirty_shards = set(range(address_book.shard_count))
+        return address_book
+    if is_indexed_file(filename):
+        if journal or shards or sqlite:
+            raise ValueError(f"{filename} is a lazily loaded book and cannot be opened with another storage")
         address_book = AddressBook()
-        address_book.data = data
+        address_book.data = LazyRecords(filename, address_book)
+        address_book.indexed = False
         return address_book
-    except (FileNotFoundError, EOFError):
-        return AddressBook()
+    address_book = AddressBook()
+    if lazy:
+        address_book.data = LazyRecords(None, address_book)
+    elif sqlite:
+        # not <filename>.tmp: snapshot writes use that while the database is open
+        temp_filename = filename + ".sqlite.tmp"
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        address_book.data = SqliteRecords(temp_filename, address_book, target=filename)
+        address_book.indexed = False
+    snapshot_seq = 0
+    try:
+        file = open(filename, 'rb')
+    except FileNotFoundError:
+        file = None
+    if file is not None:
+        with file:
+            header = read_snapshot_header(file, filename)
+            if header is not None:
+                compression, snapshot_seq = header
+                for record in read_snapshot_records(file, filename, compression):
+                    address_book.add_record(record)
+            else:
+                data, snapshot_seq = load_legacy_pickle(file, filename, journal)
+                for record in data.values():
+                    address_book.add_record(record)
+    if journal:
+        address_book.open_journal(filename + ".journal", snapshot_seq)
+    elif os.path.exists(filename + ".journal"):
+        # last saved in journal mode: fold the entries the snapshot lacks into
+        # it and drop the journal, so it is never replayed over a later save
+        address_book.open_journal(filename + ".journal", snapshot_seq)
+        if address_book.journal.seq > snapshot_seq:
+            address_book.compact(filename)
+        address_book.journal.close()
+        address_book.journal = None
+        os.remove(filename + ".journal")
+    if not (lazy or sqlite):
+        # a lazy or SQLite book still has to be converted by its first save
+        address_book.mark_saved()
+    if shards:
+        address_book.shard_count = shards
+        address_book.dirty_shards = set(range(shards))
+    return address_book
+
+
+#Bulk import/export
+CSV_FIELDS = ["name", "phones", "emails", "birthday", "addresses", "note", "tags"]
+LIST_FIELDS = ("phones", "emails", "addresses", "tags")
+IMPORT_CHUNK_SIZE = 1000
+
+
+def contact_format(filename, format=None):
+    format = format or os.path.splitext(filename)[1].lstrip(".").lower()
+    if format not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown contact file format '{format}': use .csv or .jsonl")
+    return format
+
+
+def record_to_row(record):
+    return {
+        "name": record.name.value,
+        "phones": [phone.value for phone in record.phones],
+        "emails": [email.value for email in record.email],
+        "birthday": record.birthday.value if record.birthday else "",
+        "addresses": [address.value for address in record.address],
+        "note": record.note.value if record.note else "",
+        "tags": list(record.note.tags) if record.note else [],
+    }
+
+
+def row_to_record(row):
+    """Build a Record from an import row; field validation errors raise ValueError."""
+    # JSONL rows can hold any JSON type; only strings may reach the indexes
+    for field in ("name", "birthday", "note"):
+        if not isinstance(row.get(field) or "", str):
+            raise ValueError(f"Field '{field}' must be a string")
+    for field in LIST_FIELDS:
+        items = row.get(field) or []
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise ValueError(f"Field '{field}' must be a list of strings")
+    record = Record(row.get("name") or "")
+    for phone in row.get("phones") or []:
+        record.add_phone(phone)
+    for email in row.get("emails") or []:
+        record.add_email(email)
+    if row.get("birthday"):
+        record.add_birthday(row["birthday"])
+    for address in row.get("addresses") or []:
+        record.add_address(address)
+    if row.get("note"):
+        record.add_note(row["note"], row.get("tags") or None)
+    elif row.get("tags"):
+        raise ValueError("Tags require a note")
+    return record
+
+
+def validate_rows(chunk):
+    """Process-pool worker: turn (line, row) pairs into ("ok", record) or ("error", line, name, message).
+
+    JSONL rows arrive as raw text so that parsing is spread across the pool too.
+    """
+    results = []
+    for line, row in chunk:
+        name = ""
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError("Row must be a JSON object")
+            name = row.get("name") or ""
+            results.append(("ok", row_to_record(row)))
+        except (ValueError, TypeError, AttributeError) as e:
+            results.append(("error", line, name, str(e)))
+    return results
+
+
+def read_rows(filename, format):
+    """Yield (line number, row) pairs: dicts for CSV, raw text for JSONL."""
+    with open(filename, newline="", encoding="utf-8") as file:
+        if format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                for field in LIST_FIELDS:
+                    value = row.get(field) or ""
+                    row[field] = [item.strip() for item in value.split(";") if item.strip()]
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(file, 1):
+                if text.strip():
+                    yield line, text
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def pooled(function, chunks, workers):
+    """Apply `function` to chunks in a process pool, in order, with a bounded number in flight."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield function(chunk)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def validated_chunks(chunks, workers):
+    return pooled(validate_rows, chunks, workers)
+
+
+def import_contacts(book, filename, format=None, errors_filename=None, workers=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream contacts from a CSV/JSONL file into `book`.
+
+    Rows are validated in chunks across a process pool and added in batches;
+    rejected rows are written to `errors_filename` (default: <filename>.errors.csv).
+    Returns (imported, rejected).
+    """
+    format = contact_format(filename, format)
+    errors_filename = errors_filename or filename + ".errors.csv"
+    imported = rejected = 0
+    error_file = writer = None
+    try:
+        for results in validated_chunks(chunked(read_rows(filename, format), chunk_size), workers):
+            for result in results:
+                if result[0] == "ok":
+                    book.add_record(result[1])
+                    imported += 1
+                    continue
+                if writer is None:
+                    error_file = open(errors_filename, "w", newline="", encoding="utf-8")
+                    writer = csv.writer(error_file)
+                    writer.writerow(["line", "name", "error"])
+                writer.writerow(result[1:])
+                rejected += 1
+    finally:
+        if error_file is not None:
+            error_file.close()
+    return imported, rejected
+
+
+def export_contacts(book, filename, format=None):
+    """Stream every contact of `book` to a CSV/JSONL file. Returns the number written."""
+    format = contact_format(filename, format)
+    count = 0
+    with open(filename, "w", newline="", encoding="utf-8") as file:
+        if format == "csv":
+            writer = csv.DictWriter(file, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+        for record in book.data.values():
+            row = record_to_row(record)
+            if format == "csv":
+                for field in LIST_FIELDS:
+                    row[field] = ";".join(row[field])
+                writer.writerow(row)
+            else:
+                file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+#Duplicate detection
+DEDUPE_CHUNK_SIZE = 2000
+# blocks sharing one key beyond this size (a switchboard number, a very common
+# name) would cost O(n^2) pairs and say little about duplication; they are skipped
+DEDUPE_MAX_BLOCK = 100
+SOUNDEX_CODES = {letter: str(code) for code, letters in enumerate(
+    ("aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r")) for letter in letters}
+
+
+def soundex(word):
+    """American Soundex of the ASCII letters of `word`, e.g. 'Robert' -> 'R163'."""
+    import unicodedata
+    letters = [char for char in unicodedata.normalize("NFKD", word.lower().translate(ADDRESS_FOLDS))
+               if "a" <= char <= "z"]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES[letters[0]]
+    for char in letters[1:]:
+        digit = SOUNDEX_CODES[char]
+        if digit != "0" and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def name_words(name):
+    """'Smith_John' -> ['smith', 'john']: names are single CLI words, so '_' and '-' separate too."""
+    return re.findall(r"[^\W_]+", name.lower())
+
+
+def blocking_keys(record):
+    """Keys that duplicates of `record` probably share: phone digits, e-mail, and name sound."""
+    keys = {("phone", re.sub(r"\D", "", str(phone.value))) for phone in record.phones}
+    keys.update(("email", email.value.lower()) for email in record.email)
+    sounds = sorted(filter(None, map(soundex, name_words(record.name.value))))
+    if sounds:
+        keys.add(("name", " ".join(sounds)))
+    return keys
+
+
+def score_pairs(chunk):
+    """Process-pool worker: score (name, other, shares a phone or e-mail) triples as (name, other, score)."""
+    from fuzzywuzzy import fuzz
+    results = []
+    for name, other, shared in chunk:
+        score = fuzz.token_sort_ratio(" ".join(name_words(name)), " ".join(name_words(other)))
+        if shared:
+            # a shared phone or e-mail counts for half, the names for the rest
+            score = round(50 + score / 2)
+        results.append((name, other, score))
+    return results
+
+
+class Session:
+    """The address book one CLI run works on; the file is only read on first use."""
+
+    def __init__(self, filename='addressbook.dat', storage=None):
+        self.filename = filename
+        # ADDRESS_BOOK_STORAGE=journal appends each change to <filename>.journal
+        # instead of rewriting the whole pickle on every save; ADDRESS_BOOK_STORAGE=lazy
+        # switches the file to the mmap'ed indexed format; ADDRESS_BOOK_STORAGE=sharded
+        # splits it into ADDRESS_BOOK_SHARDS files so saves rewrite only changed shards;
+        # ADDRESS_BOOK_STORAGE=sqlite migrates it to a SQLite database.
+        self.storage = storage if storage is not None else os.environ.get("ADDRESS_BOOK_STORAGE")
+        self.address_book = None
+        # held while a command runs, so an autosave never captures a half-done change
+        self.lock = threading.Lock()
+
+    @property
+    def book(self):
+        if self.address_book is None:
+            shards = int(os.environ.get("ADDRESS_BOOK_SHARDS", DEFAULT_SHARDS)) if self.storage == "sharded" else 0
+            self.address_book = load_address_book_from_file(
+                self.filename, journal=self.storage == "journal", lazy=self.storage == "lazy", shards=shards,
+                sqlite=self.storage == "sqlite")
+        return self.address_book
+
+    def save(self):
+        # nothing to write if no command ever needed the book
+        if self.address_book is not None:
+            self.address_book.save_to_file(self.filename)
+
+    def autosave(self):
+        """Save from a background thread: only the snapshot is taken between commands,
+        the file is written while the user carries on."""
+        book = self.address_book
+        if book is None:
+            return
+        with self.lock:
+            book.save_lock.acquire()
+            try:
+                write = book.prepare_save(self.filename)
+            except BaseException:
+                book.save_lock.release()
+                raise
+        try:
+            write()
+        finally:
+            book.save_lock.release()
+
+
+class Workspace:
+    """Many named books in one directory, used one at a time.
+
+    Book `name` lives in <directory>/<name>.dat; the default book is the
+    usual addressbook.dat. Loaded books stay in an LRU cache, so switching
+    back to a recent one is instant; once their estimated size exceeds
+    `memory_budget` bytes, the least recently used are saved (if changed)
+    and dropped. Offers the Session interface for the current book, so
+    command handlers work with either.
+    """
+
+    DEFAULT_BOOK = "addressbook"
+    # in-memory size of one contact with all its index entries (note, name and
+    # address trigrams included); benchmarks/bench_memory.py measures ~5.8 KB
+    CONTACT_BYTES = 6 * 1024
+
+    def __init__(self, directory=".", current=DEFAULT_BOOK, storage=None, memory_budget=None):
+        self.directory = directory
+        self.storage = storage
+        if memory_budget is None:
+            memory_budget = float(os.environ.get("ADDRESS_BOOK_MEMORY_MB", 256)) * 2 ** 20
+        self.memory_budget = memory_budget
+        self.sessions = OrderedDict()
+        self.current = current
+        # shared by all books: held while a command runs, like Session.lock
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def valid_name(name):
+        return re.fullmatch(r"[\w-]+", name) is not None
+
+    def filename(self, name):
+        return os.path.join(self.directory, name + ".dat")
+
+    def session(self, name=None):
+        name = name or self.current
+        session = self.sessions.get(name)
+        if session is None:
+            session = self.sessions[name] = Session(self.filename(name), self.storage)
+            session.lock = self.lock
+        self.sessions.move_to_end(name)
+        return session
+
+    @property
+    def book(self):
+        book = self.session().book
+        self.evict()
+        return book
+
+    @property
+    def address_book(self):
+        session = self.sessions.get(self.current)
+        return session.address_book if session is not None else None
+
+    def use(self, name):
+        """Make `name` the current book, loading it unless it is cached, and return it."""
+        if not self.valid_name(name):
+            raise ValueError(f"Invalid book name '{name}': use letters, digits, '-' and '_'")
+        self.current = name
+        return self.book
+
+    def books(self):
+        """(name, loaded, contacts or None) for every book on disk or in memory, by name."""
+        names = set(self.sessions)
+        for filename in os.listdir(self.directory):
+            name, extension = os.path.splitext(filename)
+            if extension == ".dat" and self.valid_name(name):
+                names.add(name)
+        result = []
+        for name in sorted(names):
+            session = self.sessions.get(name)
+            book = session.address_book if session is not None else None
+            result.append((name, book is not None, len(book.data) if book is not None else None))
+        return result
+
+    def memory_estimate(self):
+        return sum(session.address_book.resident_records() * self.CONTACT_BYTES
+                   for session in self.sessions.values() if session.address_book is not None)
+
+    def evict(self):
+        """Write back and drop least recently used books until the rest fit the budget."""
+        for name in list(self.sessions):
+            if self.memory_estimate() <= self.memory_budget:
+                break
+            if name != self.current:
+                self.drop(name)
+
+    def drop(self, name):
+        session = self.sessions.pop(name)
+        if session.address_book is not None:
+            session.save()
+            session.address_book.close()
+            session.address_book = None
+
+    def save(self):
+        for session in list(self.sessions.values()):
+            session.save()
+
+    def autosave(self):
+        for session in list(self.sessions.values()):
+            session.autosave()
+
+
+class Autosaver:
+    """Background thread saving a session's unsaved changes every `save_interval`
+    seconds and, when notified after a command, once `save_every` changes pile up."""
+
+    def __init__(self, session, save_every=None, save_interval=None):
+        self.session = session
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+
+    def start(self):
+        if self.save_every or self.save_interval:
+            self.thread.start()
+
+    def notify(self):
+        book = self.session.address_book
+        if self.save_every and book is not None and book.changes - book.saved_changes >= self.save_every:
+            self.wake.set()
+
+    def run(self):
+        while not self.stopped:
+            self.wake.wait(self.save_interval)
+            self.wake.clear()
+            if self.stopped:
+                break
+            try:
+                self.session.autosave()
+            except (OSError, pickle.PicklingError) as e:
+                print(f"Autosave failed: {e}")
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        if self.thread.is_alive():
+            self.thread.join()
 
 
 #Function to parse user input
@@ -251,459 +2566,1059 @@ def parse_input(user_input):
         return cmd, args
     except ValueError:
         return None, None
-    
 
- #Load address book from file   
-book = load_address_book_from_file('addressbook.dat')
 
+#Command registry
+class Command:
+    def __init__(self, name, handler, usage, threshold, writes=False):
+        self.name = name
+        self.handler = handler
+        self.usage = usage
+        self.threshold = threshold
+        # True for commands that modify the book
+        self.writes = writes
+
+
+class CommandDispatcher:
+    """Resolves user input to a command: exact dict lookup first, fuzzy match only on a miss."""
+
+    def __init__(self):
+        self.commands = {}
+        self.order = []
+        self.by_length = {}
+
+    def register(self, name, handler, usage=None, threshold=None, writes=False):
+        command = Command(name, handler, usage or name, threshold, writes)
+        self.commands[name] = command
+        if threshold is not None:
+            self.order.append(command)
+            self.by_length.setdefault(len(name), []).append(command)
+        return command
+
+    def candidates(self, cmd):
+        # fuzz.ratio can never exceed 200 * min(len) / (len(a) + len(b)),
+        # so whole length buckets can be skipped without computing a ratio.
+        size = len(cmd)
+        for length, commands in self.by_length.items():
+            best_possible = 200 * min(size, length) / (size + length)
+            for command in commands:
+                if best_possible > command.threshold:
+                    yield command
+
+    @timed("dispatch")
+    def resolve(self, cmd):
+        """Return (command, exact) or (None, False) when nothing is close enough."""
+        if not cmd:
+            return None, False
+        command = self.commands.get(cmd)
+        if command:
+            return command, True
+        # fuzzywuzzy is only imported once a command does not match exactly
+        from fuzzywuzzy import fuzz
+        best, best_score = None, 0
+        for command in self.candidates(cmd):
+            score = fuzz.ratio(cmd, command.name)
+            if score > command.threshold and score > best_score:
+                best, best_score = command, score
+        return best, False
+
+
+dispatcher = CommandDispatcher()
+
+
+def command(name, usage=None, threshold=None, aliases=(), writes=False):
+    def decorator(handler):
+        dispatcher.register(name, handler, usage, threshold, writes)
+        for alias in aliases:
+            dispatcher.register(alias, handler, usage, writes=writes)
+        return handler
+    return decorator
+
+
+#Command handlers
+@command("add", "add [name] [phone]", threshold=66, writes=True)
+def add_contact(session, args):
+    book = session.book
+    try:
+        name, phone = args
+        record = Record(name)
+        record.add_phone(phone)
+        book.add_record(record)
+        print(f"Contact {name} added with phone number {phone}")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'add [name] [phone]'")
+
+
+@command("remove-phone", "remove-phone [name] [phone]", threshold=91, writes=True)
+def remove_phone(session, args):
+    book = session.book
+    try:
+        name, phone = args
+        record = book.find(name)
+        if record:
+            phone_found = record.find_phone(phone)
+            if phone_found:
+                record.remove_phone(phone)
+                print(f"Phone number {phone} removed for contact {name}.")
+            else:
+                print(f"Phone number {phone} not found for contact {name}.")
+        else:
+            print(f"Contact {name} not found.")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'remove-phone [name] [phone]'")
 
-#BOT
-def main():
-    print ("-----------------------------------------------------------------------------")
-    print("Welcome to Your personal address book. Please provide a command or type help.")
-    print ("-----------------------------------------------------------------------------")
-    while True:
-        
-        user_input = input("Enter command: ").strip()
+
+@command("change", "change [name] [new phone]", threshold=82, writes=True)
+def change_phone(session, args):
+    book = session.book
+    try:
+        name, new_phone = args
+        record = book.find(name)
+        if record:
+            record.edit_phone(record.phones[0].value, new_phone)
+            print(f"Phone number changed for contact {name}")
+        else:
+            print("Contact not found")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'change [name] [new phone]'")
+
+
+@command("phone", "phone [name]", threshold=79)
+def show_phone(session, args):
+    book = session.book
+    try:
+        name = args[0]
+        record = book.find(name)
+        if record:
+            print(f"Phone number for {name}: {record.phones[0]}")
+        else:
+            print(f"Contact {name} not found.")
+    except IndexError as e:
+        print(e)
+        print("Invalid command format. Use 'phone [name]'")
+
+
+@command("all", "all [--page N] [--size N] [--fields name,phones,...] [--sort name/birthday/phone]", threshold=66)
+def show_all(session, args):
+    book = session.book
+    options = {"--page": "1", "--size": None, "--fields": None, "--sort": "name"}
+    try:
+        for option, value in zip(args[::2], args[1::2], strict=True):
+            if option not in options:
+                raise ValueError(option)
+            options[option] = value
+        page = int(options["--page"])
+        size = int(options["--size"]) if options["--size"] else (20 if "--page" in args else None)
+        fields = options["--fields"].split(",") if options["--fields"] else None
+        if page < 1 or (size is not None and size < 1) or (fields and not set(fields) <= set(Record.FIELDS)):
+            raise ValueError(args)
+        if options["--sort"] not in ("name", "birthday", "phone"):
+            raise ValueError(options["--sort"])
+    except ValueError:
+        print("Invalid command format. Use 'all [--page N] [--size N] [--fields name,phones,...] [--sort name/birthday/phone]'")
+        print(f"Fields: {', '.join(Record.FIELDS)}")
+        return
+    total = len(book.data)
+    if not total:
+        print("No contacts in the address book.")
+        return
+    if size is None:
+        print("All contacts:")
+    else:
+        first = (page - 1) * size + 1
+        if first > total:
+            print(f"Page {page} is empty: there are {total} contacts.")
+            return
+        pages = (total + size - 1) // size
+        print(f"Contacts {first}-{min(first + size - 1, total)} of {total} (page {page} of {pages}):")
+    for record in book.records_page(page, size, options["--sort"]):
+        print(record if fields is None else record.render(fields))
+
+
+@command("add-birthday", "add-birthday [name] [birth date]", threshold=91, writes=True)
+def add_birthday(session, args):
+    book = session.book
+    try:
+        name, birthday = args
+        record = book.find(name)
+        if record:
+            record.add_birthday(birthday)
+            print(f"Birthday added for contact {name}")
+        else:
+            print(f"Contact {name} not found")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'add-birthday [name] [birth date]'")
+
+
+@command("show-birthday", "show-birthday [name]", threshold=91)
+def show_birthday(session, args):
+    book = session.book
+    try:
+        name = args[0]
+        record = book.find(name)
+        if record and record.birthday:
+            print(f"Birthday for {name}: {record.birthday}")
+        elif record and not record.birthday:
+            print(f"No birthday set for {name}")
+        else:
+            print(f"Contact {name} not found.")
+    except IndexError as e:
+        print(e)
+        print("Invalid command format. Use 'show-birthday [name]'")
+
+
+@command("birthdays", "birthdays [int]", threshold=88)
+def birthdays(session, args):
+    book = session.book
+    try:
+        threshold = int(args[0]) if args else 7
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'birthdays [int]'")
+        return
+    birthday_dict = book.get_birthdays_per_week(threshold)
+    if any(birthday_dict.values()):
+        print(f"Birthdays in the next {threshold} days:")
+        for day, names in birthday_dict.items():
+            if names:
+                print(f"{day}: {', '.join(names)}")
+    else:
+        print(f"No birthdays in the {threshold} days.")
+
+
+@command("next-birthdays", "next-birthdays [count] [from DD.MM.YYYY]", threshold=91)
+def next_birthdays(session, args):
+    book = session.book
+    try:
+        count = int(args[0]) if args else 5
+        start = datetime.strptime(args[1], "%d.%m.%Y").date() if len(args) > 1 else None
+        upcoming = book.next_birthdays(count, start)
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'next-birthdays [count] [from DD.MM.YYYY]'")
+        return
+    if upcoming:
+        print(f"Next {len(upcoming)} birthdays:")
+        for birthday_date, name in upcoming:
+            print(f"{birthday_date.strftime('%d.%m.%Y')} ({birthday_date.strftime('%A')}): {name}")
+    elif count:
+        print("No birthdays in the address book.")
+
+
+@command("birthdays-between", "birthdays-between [from DD.MM.YYYY] [to DD.MM.YYYY] [week/month]", threshold=93)
+def birthdays_between(session, args):
+    book = session.book
+    try:
+        start, end = (datetime.strptime(arg, "%d.%m.%Y").date() for arg in args[:2])
+        period = args[2].lower() if len(args) > 2 else "week"
+        groups = list(book.birthdays_grouped(start, end, period))
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'birthdays-between [from DD.MM.YYYY] [to DD.MM.YYYY] [week/month]'")
+        return
+    if not groups:
+        print("No birthdays in that period.")
+    for group, items in groups:
+        title = f"Week of {group.strftime('%d.%m.%Y')}" if period == "week" else group.strftime("%B %Y")
+        print(f"{title}: " + ", ".join(f"{name} ({birthday_date.strftime('%d.%m')})" for birthday_date, name in items))
+
+
+@command("hello", threshold=79)
+def hello(session, args):
+    print("Hello!")
+
+
+@command("add-note", "add-note [name] [note]", threshold=91, writes=True)
+def add_note(session, args):
+    book = session.book
+    try:
+        name, *note = args
+        note = " ".join(note)
+        record = book.find(name)
+        if record:
+            record.add_note(note)
+            print(f"Note added for contact {name}")
+        else:
+            print(f"Contact {name} not found")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'add-note [name] [note]'")
+
+
+@command("edit-note", "edit-note [name] [note]", threshold=91, writes=True)
+def edit_note(session, args):
+    book = session.book
+    try:
+        name, *note = args
+        note = " ".join(note)
+        record = book.find(name)
+        if record:
+            record.edit_note(note)
+            print(f"Note edited for contact {name}")
+        else:
+            print(f"Contact {name} not found")
+    except ValueError as e:
+        print("Invalid command format. Use 'edit-note [name] [new note]")
+
+
+@command("remove-note", "remove-note [name] [note]", threshold=91, writes=True)
+def remove_note(session, args):
+    book = session.book
+    try:
+        name = args[0]
+        record = book.find(name)
+        if record:
+            record.remove_note()
+            print(f"Note removed for contact {name}")
+        else:
+            print(f"Contact {name} not found")
+    except IndexError as e:
+        print("Invalid command format. Use 'remove-note [name]")
+
+
+@command("find-by-note", "find_by_note [pattern]", threshold=91)
+def find_by_note(session, args):
+    book = session.book
+    if args:
+        pattern = " ".join(args)
+        try:
+            matching_contacts = book.find_by_note(pattern)
+            if matching_contacts:
+                print("Contacts with matching note content:")
+                for name in matching_contacts:
+                    print(name)
+            else:
+                print("No contacts found with the given note content.")
+        except re.error as e:
+            print(f"Invalid regex pattern: {e}")
+    else:
+        print("Invalid command format. Use 'find_by_note [regex pattern]'")
+
+
+@command("find-by-item", "find_by_item [name/birthday/email/number]", threshold=91)
+def find_by_item(session, args):
+    book = session.book
+    try:
+        item = args[0]
+        book.find_by_item(item)
+    except IndexError as e:
+        print("Invalid command format. Use 'find_by_item [name/birthday/email/number]'")
+
+
+@command("find-by-domain", "find-by-domain [domain]", threshold=91)
+def find_by_domain(session, args):
+    book = session.book
+    if len(args) != 1:
+        print("Invalid command format. Use 'find-by-domain [domain]', e.g. 'find-by-domain example.com'")
+        return
+    names = book.find_by_domain(args[0])
+    if names:
+        print(f"Contacts with an e-mail at {args[0]}:")
+        for name in names:
+            print(name)
+    else:
+        print(f"No contacts with an e-mail at {args[0]}.")
+
+
+@command("find-by-address", "find-by-address [words]", threshold=91)
+def find_by_address(session, args):
+    book = session.book
+    if not args:
+        print("Invalid command format. Use 'find-by-address [words]', e.g. 'find-by-address krakow dluga'")
+        return
+    names = book.find_by_address(" ".join(args))
+    if names:
+        print("Contacts with matching addresses:")
+        for name in names:
+            print(name)
+    else:
+        print("No contacts found with the given address.")
+
+
+@command("add-address", "add-address [name] [address]", threshold=90, writes=True)
+def add_address(session, args):
+    book = session.book
+    if len(args) < 2:
+        print("Invalid command format. Use 'add-address [name] [address]'.")
+        return
+    try:
+        name = args[0]
+        address = " ".join(args[1:])
+        record = book.find(name)
+        if record:
+            record.add_address(address)
+            print(f"Address added to contact {name}")
+        else:
+            print(f"Contact {name} not found")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'add-address [name] [address]'")
+
+
+@command("remove-address", threshold=66, writes=True)
+def remove_address(session, args):
+    book = session.book
+    try:
+        name, address = args
+        record = book.find(name)
+        if record:
+            record.remove_address(address)
+            print(f"All addressess removed from contact")
+        else:
+            print(f"Contact {name} not found.")
+    except ValueError as e:
+        print("Invalid command format. Use 'remove-address [name] [address (you can provie first part of address).]'")
+
+
+@command("add-email", threshold=66, writes=True)
+def add_email(session, args):
+    book = session.book
+    try:
+        name, email = args
+        record = book.find(name)
+        if record:
+            record.add_email(email)
+            print(f"e-mail added to contact {name}")
+        else:
+            print(f"Contact {name} not found")
+    except ValueError as e:
+        print("Invalid command format. '")
+
+
+@command("add-tag", "add-tag [name] [tag]", threshold=91, writes=True)
+def add_tag(session, args):
+    book = session.book
+    try:
+        name, tag = args
+        record = book.find(name)
+        if record and record.note:
+            record.note.add_tag(tag)
+            print(f"Tag '{tag}' added to note for contact {name}.")
+        else:
+            print(f"Note for contact {name} not found or contact does not exist.")
+    except ValueError as e:
+        print(e)
+        print("Invalid command format. Use 'add-tag [name] [tag]'")
+
+
+@command("search-by-tag", "search-by-tag [tag]", threshold=91)
+def search_by_tag(session, args):
+    book = session.book
+    try:
+        tag = args[0]
+        matching_records = book.search_by_tag(tag)
+        if matching_records:
+            print(f"Found notes with tag '{tag}':")
+            for record in matching_records:
+                print(f"Contact {record.name.value}: {record.note}")
+        else:
+            print(f"No notes found with tag '{tag}'.")
+    except IndexError as e:
+        print(e)
+        print("Invalid command format. Use 'search-by-tag [tag]'")
+
+
+@command("search-by-tags", "search-by-tags [tag AND/OR/NOT tag ...]", threshold=93)
+def search_by_tags(session, args):
+    book = session.book
+    if not args:
+        print("Invalid command format. Use 'search-by-tags [tag AND/OR/NOT tag ...]'")
+        return
+    query = " ".join(args)
+    try:
+        matching_records = book.search_by_tags(query)
+    except ValueError as e:
+        print(e)
+        return
+    if matching_records:
+        print(f"Found notes matching '{query}':")
+        for record in matching_records:
+            print(f"Contact {record.name.value}: {record.note}")
+    else:
+        print(f"No notes found matching '{query}'.")
+
+
+@command("find-phone-prefix", "find-phone-prefix [digits] [limit]", threshold=91)
+def find_phone_prefix(session, args):
+    book = session.book
+    try:
+        prefix = args[0]
+        limit = int(args[1]) if len(args) > 1 else 20
+        if limit < 0:
+            raise ValueError(f"Cannot list {limit} phones: the limit must not be negative")
+    except (IndexError, ValueError):
+        print("Invalid command format. Use 'find-phone-prefix [digits] [limit]'")
+        return
+    found = False
+    for phone, name in book.find_by_phone_prefix(prefix, limit):
+        if not found:
+            print(f"Phones starting with {prefix}:")
+            found = True
+        print(f"{phone}: {name}")
+    if not found:
+        print(f"No phones start with {prefix}.")
+
+
+@command("find-similar", "find-similar [name] [count]", threshold=91)
+def find_similar(session, args):
+    book = session.book
+    try:
+        name = args[0]
+        limit = int(args[1]) if len(args) > 1 else 5
+        matches = book.find_similar(name, limit)
+    except (IndexError, ValueError):
+        print("Invalid command format. Use 'find-similar [name] [count]'")
+        return
+    if matches:
+        print(f"Contacts similar to '{name}':")
+        for other, score in matches:
+            print(f"{other} ({score}%)")
+    else:
+        print(f"No contacts similar to '{name}'.")
+
+
+@command("dedupe", "dedupe [min score] [merge]", threshold=83, writes=True)
+def dedupe(session, args):
+    book = session.book
+    threshold, merge = 85, False
+    try:
+        for arg in args:
+            if arg.lower() == "merge":
+                merge = True
+            else:
+                threshold = int(arg)
+    except ValueError:
+        print("Invalid command format. Use 'dedupe [min score] [merge]', e.g. 'dedupe 90 merge'")
+        return
+    proposals = book.find_duplicates(threshold)
+    if not proposals:
+        print("No duplicate contacts found.")
+        return
+    print("Possible duplicates:")
+    for score, name, other, reasons in proposals:
+        print(f"{name} <-> {other}: {score}% (same {', '.join(reasons)})")
+    if merge:
+        for name, others in book.merge_duplicates(proposals):
+            print(f"Merged {', '.join(others)} into {name}")
+    else:
+        print("Use 'dedupe [min score] merge' to merge them.")
+
+
+@command("import", "import [file.csv/file.jsonl] [errors file]", threshold=83, writes=True)
+def import_file(session, args):
+    book = session.book
+    if not args or len(args) > 2:
+        print("Invalid command format. Use 'import [file.csv/file.jsonl] [errors file]'")
+        return
+    filename = args[0]
+    errors_filename = args[1] if len(args) > 1 else filename + ".errors.csv"
+    try:
+        imported, rejected = import_contacts(book, filename, errors_filename=errors_filename)
+    except (OSError, ValueError, csv.Error) as e:
+        print(e)
+        return
+    print(f"Imported {imported} contacts from {filename}")
+    if rejected:
+        print(f"{rejected} rows rejected, see {errors_filename}")
+
+
+@command("export", "export [file.csv/file.jsonl]", threshold=83)
+def export_file(session, args):
+    book = session.book
+    try:
+        filename = args[0]
+        count = export_contacts(book, filename)
+        print(f"Exported {count} contacts to {filename}")
+    except IndexError:
+        print("Invalid command format. Use 'export [file.csv/file.jsonl]'")
+    except (OSError, ValueError) as e:
+        print(e)
+
+
+@command("stats", "stats [on/off/reset/json [file]]", threshold=88)
+def show_stats(session, args):
+    action = args[0].lower() if args else ""
+    if action in ("on", "off"):
+        stats.enabled = action == "on"
+        print(f"Instrumentation {action}")
+    elif action == "reset":
+        stats.reset()
+        print("Statistics cleared")
+    elif action == "json":
+        report = json.dumps({"enabled": stats.enabled, "timings": stats.summary()}, indent=2)
+        if len(args) > 1:
+            with open(args[1], "w") as file:
+                file.write(report)
+            print(f"Statistics written to {args[1]}")
+        else:
+            print(report)
+    elif action:
+        print("Invalid command format. Use 'stats [on/off/reset/json [file]]'")
+    else:
+        timings = stats.summary()
+        if not timings:
+            print("No statistics collected." + ("" if stats.enabled else " Use 'stats on' to start."))
+            return
+        print(f"{'operation':<34}{'count':>8}{'total ms':>11}{'mean us':>10}{'p50 us':>9}{'p99 us':>9}{'max us':>9}")
+        for name, entry in sorted(timings.items(), key=lambda item: -item[1]["total_us"]):
+            print(f"{name:<34}{entry['count']:>8}{entry['total_us'] / 1000:>11.1f}{entry['mean_us']:>10.1f}"
+                  f"{entry['p50_us']:>9}{entry['p99_us']:>9}{entry['max_us']:>9}")
+
+
+profiler = None
+
+
+@command("profile", "profile [on/off]", threshold=85)
+def profile(session, args):
+    global profiler
+    action = args[0].lower() if args else ""
+    if action == "on":
+        if profiler is None:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        print("Profiling on")
+    elif action == "off":
+        if profiler is None:
+            print("Profiling is not running")
+            return
+        profiler.disable()
+        import pstats
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(20)
+        profiler = None
+    else:
+        print("Invalid command format. Use 'profile [on/off]'")
+
+
+@command("use", "use [book]", threshold=66)
+def use(session, args):
+    if not isinstance(session, Workspace):
+        print("Switching books is not available here.")
+        return
+    if not args:
+        print(f"Using book {session.current}")
+        return
+    try:
+        book = session.use(args[0])
+    except ValueError as e:
+        print(e)
+        return
+    if book.data or os.path.exists(session.filename(args[0])):
+        print(f"Using book {args[0]} ({len(book.data)} contacts)")
+    else:
+        print(f"Using new book {args[0]}")
+
+
+@command("books", threshold=80)
+def books(session, args):
+    if not isinstance(session, Workspace):
+        print("Switching books is not available here.")
+        return
+    for name, loaded, contacts in session.books():
+        marker = "*" if name == session.current else " "
+        status = f"loaded, {contacts} contacts" if loaded else "on disk"
+        print(f"{marker} {name} ({status})")
+
+
+@command("close", aliases=("exit",))
+def close(session, args):
+    session.save()
+    print("Saving address book and closing the app.")
+    return True
+
+
+@command("save")
+def save(session, args):
+    session.save()
+    print("Saving your contact list")
+
+
+@command("help", aliases=("?",))
+def show_help(session, args):
+    print ("Avalible commands:")
+    print ("1. add [name] [phone_number] - add user name and 10 digits phone number to address book.")
+    print ("2. add-email [name] [email address] - adding email to user in adres book")
+    print ("3. remove-phone [name] [phone] - removes phone from name")
+    print ("4. change [name] [new_phomne] - change phone for specyfic name")
+    print ("5. all [--page N] [--size N] [--fields name,phones,...] [--sort name/birthday/phone] - lists all record in phone book")
+    print ("6. add-birthday [name] [birth_day in (DD.MM.YYYY)] - adding birthday to specyfic name")
+    print ("7. show-birthday [name] - show birthday for user")
+    print ("8. birhdays [number_days] - users who got birthdays from [number_days]")
+    print ("9. next-birthdays [count] [from DD.MM.YYYY] - the next [count] birthdays")
+    print ("10. birthdays-between [from] [to] [week/month] - birthdays in a date range, grouped by week or month")
+    print ("11. NOTES: add-note [name], edit-note [name], remove-note [name] - adding, edit, remove notes from contact name")
+    print ("12. find-by-item [item] - finding by item in address book")
+    print ("13. add-address [name] - adding address to user name")
+    print ("14. find-by-domain [domain] - users with an e-mail at domain, e.g. example.com")
+    print ("15. find-by-address [words] - users whose address contains all the words")
+    print ("16. add-tag [name] [tag] - adding tag to user name")
+    print ("17. search-by-tag [tag] - search user by tag")
+    print ("18. search-by-tags [query] - search user by tags, e.g. work AND NOT done, home OR family")
+    print ("19. find-phone-prefix [digits] [limit] - phones starting with [digits]")
+    print ("20. find-similar [name] [count] - contacts with names similar to [name]")
+    print ("21. import [file] [errors file] - import contacts from a .csv or .jsonl file")
+    print ("22. dedupe [min score] [merge] - find contacts that look like duplicates, and merge them")
+    print ("23. export [file] - export all contacts to a .csv or .jsonl file")
+    print ("24. stats [on/off/reset/json [file]] - command and operation timings")
+    print ("25. profile [on/off] - run cProfile and print the hottest functions")
+    print ("26. use [book] - switch to another address book, creating it if needed")
+    print ("27. books - list address books")
+    print ("28. save - saving data to file")
+    print ("29. close or exit - exit and save results")
+
+
+def run_command(command, session, args):
+    start = time.perf_counter() if stats.enabled else None
+    try:
+        return command.handler(session, args)
+    except CorruptBookError as e:
+        # leave the file alone: the book was not loaded, so it is not saved over either
+        print(f"Cannot open the address book: {e}")
+    finally:
+        if start is not None:
+            stats.record(f"command {command.name}", time.perf_counter() - start)
+
+
+#Batch mode
+def run_batch(session, lines, out, json_output=False):
+    """Run commands non-interactively: exact command names only, no prompts,
+    one save at the end. Returns the number of lines that were not valid commands."""
+    failures = 0
+    for line_number, user_input in enumerate(lines, 1):
+        user_input = user_input.strip()
+        if not user_input or user_input.startswith("#"):
+            continue
         cmd, args = parse_input(user_input)
-        
-        if fuzz.ratio(cmd,"add")>66:
-            
-            if fuzz.ratio(cmd,"add")<100:
-                is_ok = input("Did you mean to enter 'add [name] [phone]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"add")==100 or is_ok == "y":     
-                try:
-                    name, phone = args
-                    record = Record(name)
-                    record.add_phone(phone)
-                    book.add_record(record)
-                    print(f"Contact {name} added with phone number {phone}")
+        command, exact = dispatcher.resolve(cmd)
+        buffer = io.StringIO()
+        ok = command is not None and exact
+        stop = False
+        if not ok:
+            failures += 1
+            buffer.write(f"Unknown command '{cmd}' on line {line_number}\n")
+        elif command.handler is close:
+            stop = True
+        elif command.handler is not save:
+            with redirect_stdout(buffer):
+                run_command(command, session, args)
+        if json_output:
+            result = {"line": line_number, "command": cmd, "args": args, "ok": ok,
+                      "output": buffer.getvalue().splitlines()}
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        else:
+            out.write(buffer.getvalue())
+        if stop:
+            break
+    session.save()
+    out.flush()
+    return failures
 
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'add [name] [phone]'")
 
-        elif fuzz.ratio(cmd,"remove-phone")>91:
-            
-            if fuzz.ratio(cmd,"remove-phone")<100:
-                is_ok = input("Did you mean to enter 'remove-phone [name] [phone]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"remove-phone")==100 or is_ok == "y":  
-                try:
-                    name, phone = args
-                    record = book.find(name)
-                    if record:
-                        phone_found = record.find_phone(phone)
-                        if phone_found:
-                            record.remove_phone(phone)
-                            print(f"Phone number {phone} removed for contact {name}.")
-                        else:
-                            print(f"Phone number {phone} not found for contact {name}.")
-                    else:
-                        print(f"Contact {name} not found.")
-
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'remove-phone [name] [phone]'")
-
-        elif fuzz.ratio(cmd,"change")>82:
-            
-            if fuzz.ratio(cmd,"change")<100:
-                is_ok = input("Did you mean to enter 'change [name] [new phone]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"change")==100 or is_ok == "y":  
-                try:
-                    name, new_phone = args
-                    record = book.find(name)
-                    if record:
-                        record.edit_phone(record.phones[0].value, new_phone)
-                        print(f"Phone number changed for contact {name}")
-                    else:
-                        print("Contact not found")
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'change [name] [new phone]'")
-
-        elif fuzz.ratio(cmd,"phone")>79:
-            
-            if fuzz.ratio(cmd,"phone")<100:
-                is_ok = input("Did you mean to enter 'phone [name]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"phone")==100 or is_ok == "y": 
-                try:
-                    name = args[0]
-                    record = book.find(name)
-                    if record:
-                        print(f"Phone number for {name}: {record.phones[0]}")
-                    else:
-                        print(f"Contact {name} not found.")
-                except IndexError as e:
-                    print(e)
-                    print("Invalid command format. Use 'phone [name]'")
-
-        elif fuzz.ratio(cmd,"all")>66:
-            
-            if fuzz.ratio(cmd,"all")<100:
-                is_ok = input("Did you mean to enter 'all'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"all")==100 or is_ok == "y":
-                if book.data:
-                    print("All contacts:")
-                    for record in book.data.values():
-                        print(record)
-                else:
-                    print("No contacts in the address book.")
+#Server mode
+class ThreadOutput(io.TextIOBase):
+    """sys.stdout replacement that sends print() output to a per-thread buffer when one is set."""
 
-        elif fuzz.ratio(cmd,"add-birthday")>91:
-            
-            if fuzz.ratio(cmd,"add-birthday")<100:
-                is_ok = input("Did you mean to enter 'add-birthday [name] [birth date]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"add-birthday")==100 or is_ok == "y":
-                try:
-                    name, birthday = args
-                    record = book.find(name)
-                    if record:
-                        record.add_birthday(birthday)
-                        print(f"Birthday added for contact {name}")
-                    else:
-                        print(f"Contact {name} not found")
-                        
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'add-birthday [name] [birth date]'")
-
-        elif fuzz.ratio(cmd,"show-birthday")>91:
-            
-            if fuzz.ratio(cmd,"show-birthday")<100:
-                is_ok = input("Did you mean to enter 'show-birthday [name]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"show-birthday")==100 or is_ok == "y":
-                try:
-                    name = args[0]
-                    record = book.find(name)
-                    if record and record.birthday:
-                        print(f"Birthday for {name}: {record.birthday}")
-                    elif record and not record.birthday:
-                        print(f"No birthday set for {name}")
-                    else: 
-                        print(f"Contact {name} not found.")
-                except IndexError as e:
-                    print(e)
-                    print("Invalid command format. Use 'show-birthday [name]'")
-
-        elif fuzz.ratio(cmd,"birthdays")>88:
-            
-            if fuzz.ratio(cmd,"birthdays")<100:
-                is_ok = input("Did you mean to enter 'birthdays [int]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"birthdays")==100 or is_ok == "y":
-                try:
-                    if args:
-                        threshold=int(args[0])
-                        book.get_birthdays_per_week(threshold)
-                    else:
-                        book.get_birthdays_per_week()
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'birthdays [int]'")
-
-        elif fuzz.ratio(cmd,"hello")>79:
-            
-            if fuzz.ratio(cmd,"hello")<100:
-                is_ok = input("Did you mean to enter 'hello'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"hello")==100 or is_ok == "y":
-                print("Hello!")
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
 
-        elif fuzz.ratio(cmd,"all")>66:
-            
-            if fuzz.ratio(cmd,"all")<100:
-                is_ok = input("Did you mean to enter 'all'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"all")==100 or is_ok == "y":
-                if book.data:
-                    print("All contacts:")
-                    for record in book.data.values():
-                        print(record)
-                else:
-                    print("No contacts in the address book.")
+    def writable(self):
+        return True
 
-        elif fuzz.ratio(cmd,"add-birthday")>91:
-            
-            if fuzz.ratio(cmd,"add-birthday")<100:
-                is_ok = input("Did you mean to enter 'add-birthday [name] [birth date]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"add-birthday")==100 or is_ok == "y":
-                try:
-                    name, birthday = args
-                    record = book.find(name)
-                    if record:
-                        record.add_birthday(birthday)
-                        print(f"Birthday added for contact {name}")
-                    else:
-                        print(f"Contact {name} not found")
-                        
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'add-birthday [name] [birth date]'")
-
-        elif fuzz.ratio(cmd,"show-birthday")>91:
-            
-            if fuzz.ratio(cmd,"show-birthday")<100:
-                is_ok = input("Did you mean to enter 'show-birthday [name]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"show-birthday")==100 or is_ok == "y":
-                try:
-                    name = args[0]
-                    record = book.find(name)
-                    if record and record.birthday:
-                        print(f"Birthday for {name}: {record.birthday}")
-                    elif record and not record.birthday:
-                        print(f"No birthday set for {name}")
-                    else: 
-                        print(f"Contact {name} not found.")
-                except IndexError as e:
-                    print(e)
-                    print("Invalid command format. Use 'show-birthday [name]'")
-
-        elif fuzz.ratio(cmd,"birthdays")>88:
-            
-            if fuzz.ratio(cmd,"birthdays")<100:
-                is_ok = input("Did you mean to enter 'birthdays [int]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"birthdays")==100 or is_ok == "y":
-                try:
-                    if args:
-                        threshold=int(args[0])
-                        book.get_birthdays_per_week(threshold)
-                    else:
-                        book.get_birthdays_per_week()
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'birthdays [int]'")
-
-        elif fuzz.ratio(cmd,"add-note")>91:
-            
-            if fuzz.ratio(cmd,"add-note")<100:
-                is_ok = input("Did you mean to enter 'add-note [name] [note]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"add-note")==100 or is_ok == "y":    
-            
-                try:
-                    name, *note = args
-                    note = " ".join(note)
-                    record = book.find(name)
-                    if record:
-                        record.add_note(note)
-                        print(f"Note added for contact {name}")
-                    else:
-                        print(f"Contact {name} not found")
-
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'add-note [name] [note]'")
-
-        elif fuzz.ratio(cmd,"edit-note")>91:
-            
-            if fuzz.ratio(cmd,"edit-note")<100:
-                is_ok = input("Did you mean to enter 'edit-note [name] [note]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"edit-note")==100 or is_ok == "y":     
-                try:
-                    name, *note = args
-                    note = " ".join(note)
-                    record = book.find(name)
-                    if record:
-                        record.edit_note(note)
-                        print(f"Note edited for contact {name}")
-                    else:
-                        print(f"Contact {name} not found")
-
-                except ValueError as e:
-                    
-                    print("Invalid command format. Use 'edit-note [name] [new note]")
-
-        elif fuzz.ratio(cmd,"remove-note")>91:
-            
-            if fuzz.ratio(cmd,"remove-note")<100:
-                is_ok = input("Did you mean to enter 'remove-note [name] [note]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"remove-note")==100 or is_ok == "y": 
-                try:
-                    name = args[0]
-                    record = book.find(name)
-                    if record:
-                        record.remove_note()
-                        print(f"Note removed for contact {name}")
-                    else:
-                        print(f"Contact {name} not found")
-
-                except ValueError as e:
-                    
-                    print("Invalid command format. Use 'remove-note [name]")
-
-        elif fuzz.ratio(cmd,"find-by-note")>91:
-            if fuzz.ratio(cmd,"find-by-note")<100:
-                is_ok = input("Did you mean to enter 'find_by_note [pattern]'? (y/n): ").lower()
-
-            if fuzz.ratio(cmd,"find-by-note")==100 or is_ok == "y": 
-                if args:
-                    pattern = " ".join(args)
-                    try:
-                        matching_contacts = book.find_by_note(pattern)
-                        if matching_contacts:
-                            print("Contacts with matching note content:")
-                            for name in matching_contacts:
-                                print(name)
-                        else:
-                            print("No contacts found with the given note content.")
-                    except re.error as e:
-                        print(f"Invalid regex pattern: {e}")
-                else:
-                    print("Invalid command format. Use 'find_by_note [regex pattern]'")
-                    
-
-        elif fuzz.ratio(cmd,"find-by-item")>91:
-            if fuzz.ratio(cmd,"find-by-item")<100:
-                is_ok = input("Did you mean to enter 'find_by_item [name/birthday/email/number]'? (y//n): ").lower()
-                
-            if fuzz.ratio(cmd,"find-by-item")==100 or is_ok == "y": 
-                try:
-                    item = args[0]
-                    book.find_by_item(item)
-                except IndexError as e:
-                    
-                    print("Invalid command format. Use 'find_by_item [name/birthday/email/number]'")
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.default).write(text)
 
+    def flush(self):
+        self.default.flush()
 
-        elif fuzz.ratio(cmd,"add-address")>90:
-            if fuzz.ratio(cmd,"add-address")<100:
-                is_ok = input("Did you mean to enter 'add-address [name] [address]'? (y/n): ").lower()
 
-            if fuzz.ratio(cmd,"add-address")==100 or is_ok == "y":        
-                if len(args) < 2:
-                    print("Invalid command format. Use 'add-address [name] [address]'.")
-                else:
-                    try:
-                        name = args[0]
-                        address = " ".join(args[1:])  
-                        record = book.find(name)
-                        if record:
-                            record.add_address(address)
-                            print(f"Address added to contact {name}")
-                        else:
-                            print(f"Contact {name} not found") 
-                    except ValueError as e:
-                        print(e)
-                        print("Invalid command format. Use 'add-address [name] [address]'")
+class ReadWriteLock:
+    """asyncio lock that lets readers share the book and gives writers exclusive access.
 
+    Waiting writers block new readers, so a stream of reads cannot starve them.
+    """
 
-        elif fuzz.ratio(cmd,"remove-address")>66:
+    def __init__(self):
+        import asyncio
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+        self.condition = asyncio.Condition()
 
-            if fuzz.ratio(cmd,"remove-address")<100:
-                is_ok = input("Did you mean to enter 'remove-address'? (y//n): ").lower()
+    @asynccontextmanager
+    async def reading(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writer and not self.waiting_writers)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @asynccontextmanager
+    async def writing(self):
+        async with self.condition:
+            self.waiting_writers += 1
+            await self.condition.wait_for(lambda: not self.writer and not self.readers)
+            self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class AddressBookServer:
+    """Serves one shared AddressBook over TCP, one JSON object per line.
+
+    A request is {"id": ..., "command": "phone bob"} (or just the command
+    text); the reply is {"id": ..., "ok": bool, "output": [lines]}. Clients may
+    pipeline requests; replies come back in request order. Commands match
+    exactly, as in batch mode. Read commands run concurrently in worker
+    threads, writes one at a time. The book is saved after `save_every`
+    writes, every `save_interval` seconds, on 'save' and when the server stops.
+    """
+
+    def __init__(self, session, save_every=None, save_interval=None):
+        self.session = session
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.unsaved = 0
+        self.server = None
+        self.saver = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        # asyncio is imported here rather than at the top so it does not slow down CLI start-up
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.lock = ReadWriteLock()
+        book = self.session.book
+        # build lazily created indexes up front rather than on the first query; a
+        # SQLite book answers most queries in SQL and may not fit in memory
+        if not isinstance(book.data, SqliteRecords):
+            book.ensure_indexes()
+        self.stdout = sys.stdout
+        sys.stdout = ThreadOutput(self.stdout)
+        self.server = await asyncio.start_server(self.handle, host, port)
+        if self.save_interval:
+            self.saver = self.loop.create_task(self.save_periodically())
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.saver is not None:
+            self.saver.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+        await self.save()
+        sys.stdout = self.stdout
+
+    async def save_periodically(self):
+        import asyncio
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self.unsaved:
+                await self.save()
+
+    async def save(self):
+        async with self.lock.reading():
+            self.unsaved = 0
+            await self.loop.run_in_executor(None, self.session.save)
+
+    def run_handler(self, command, args):
+        buffer = io.StringIO()
+        sys.stdout.local.buffer = buffer
+        try:
+            run_command(command, self.session, args)
+        finally:
+            sys.stdout.local.buffer = None
+        return buffer.getvalue().splitlines()
 
-            if fuzz.ratio(cmd,"remove-address")==100 or is_ok == "y":
-    
+    async def execute(self, user_input):
+        """Run one command line; returns (ok, output lines, close connection)."""
+        cmd, args = parse_input(user_input)
+        command, exact = dispatcher.resolve(cmd)
+        if command is None or not exact:
+            return False, [f"Unknown command '{cmd}'"], False
+        if command.handler is close:
+            return True, [], True
+        try:
+            if command.handler is save:
+                await self.save()
+                return True, ["Saving your contact list"], False
+            if command.writes:
+                async with self.lock.writing():
+                    try:
+                        output = await self.loop.run_in_executor(None, self.run_handler, command, args)
+                    finally:
+                        # a command that failed halfway may still have changed the book
+                        self.unsaved += 1
+                if self.save_every and self.unsaved >= self.save_every:
+                    await self.save()
+            else:
+                async with self.lock.reading():
+                    output = await self.loop.run_in_executor(None, self.run_handler, command, args)
+        except Exception as e:
+            # reply instead of dropping the connection and the requests pipelined after this one
+            return False, [f"Command '{cmd}' failed: {e}"], False
+        return True, output, False
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                text = line.decode("utf-8", errors="replace").strip()
+                if not text:
+                    continue
+                request_id = None
                 try:
-                    name, address = args
-                    record = book.find(name)
-                    if record:
-                        record.remove_address(address)
-                    else:
-                        print(f"Contact {name} not found.")
-                except ValueError as e:
-                    
-                    print("Invalid command format. Use 'remove-address [name] [address (you can provie first part of address).]'")
+                    request = json.loads(text)
+                except json.JSONDecodeError:
+                    request = text
+                if isinstance(request, dict):
+                    request_id = request.get("id")
+                    request = str(request.get("command", ""))
+                elif not isinstance(request, str):
+                    request = text
+                ok, output, done = await self.execute(request)
+                reply = {"id": request_id, "ok": ok, "output": output}
+                writer.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+                if done:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def send_commands(commands, host="127.0.0.1", port=8765):
+    """Pipeline `commands` to a running server and return the replies in order."""
+    import asyncio
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request_id, user_input in enumerate(commands):
+            request = {"id": request_id, "command": user_input}
+            writer.write((json.dumps(request) + "\n").encode("utf-8"))
+        await writer.drain()
+        replies = []
+        for _ in commands:
+            line = await reader.readline()
+            if not line:
+                break
+            replies.append(json.loads(line))
+        return replies
+    finally:
+        writer.close()
+
+
+def serve(session, host, port, save_every=None, save_interval=None):
+    import asyncio
+
+    async def run():
+        server = AddressBookServer(session, save_every, save_interval)
+        await server.start(host, port)
+        print(f"Serving address book on {host}:{server.port}", file=server.stdout, flush=True)
+        try:
+            await server.server.serve_forever()
+        finally:
+            await server.stop()
 
-        elif fuzz.ratio(cmd,"add-email")>66:
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
 
-            if fuzz.ratio(cmd,"add-email")<100:
-                is_ok = input("Did you mean to enter 'add-email'? (y//n): ").lower()
 
-            if fuzz.ratio(cmd,"add-email")==100 or is_ok == "y":
+#BOT
+def main(argv=None):
+    import argparse  # deferred: only the CLI entry point needs it, not importers of this module
+    parser = argparse.ArgumentParser(prog="address-book", description="Personal address book.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run commands from FILE ('-' for stdin) without prompting, then save once")
+    parser.add_argument("--json", action="store_true", help="in batch mode, print one JSON result per command")
+    parser.add_argument("--serve", metavar="HOST:PORT",
+                        help="serve the address book to TCP clients (one JSON request per line)")
+    parser.add_argument("--save-every", type=int, metavar="N",
+                        help="in server and interactive mode, save after N changes")
+    parser.add_argument("--save-interval", type=float, metavar="SECONDS",
+                        help="in server and interactive mode, save unsaved changes every SECONDS")
+    options = parser.parse_args(argv)
+    # server clients share one book; interactive and batch runs can switch books with 'use'
+    session = Session() if options.serve else Workspace()
+
+    profile_file = os.environ.get("ADDRESS_BOOK_PROFILE")
+    if profile_file:
+        import cProfile
+        whole_run = cProfile.Profile()
+        whole_run.enable()
+        try:
+            return run_cli(session, options)
+        finally:
+            whole_run.disable()
+            whole_run.dump_stats(profile_file)
+    return run_cli(session, options)
 
-        
-                try:
-                    name, email = args 
-                    record = book.find(name)
-                    if record:
-                        record.add_email(email)
-                        print(f"e-mail added to contact {name}")
-                    else:
-                        print(f"Contact {name} not found")
 
-                except ValueError as e:
-                    print("Invalid command format. '")
+def run_cli(session, options):
+    if options.serve:
+        host, _, port = options.serve.rpartition(":")
+        serve(session, host or "127.0.0.1", int(port), options.save_every, options.save_interval)
+        return 0
 
-        
-        elif fuzz.ratio(cmd, "add-tag") > 91:
-            if fuzz.ratio(cmd, "add-tag") < 100:
-                is_ok = input("Did you mean to enter 'add-tag [name] [tag]'? (y/n): ").lower()
+    if options.batch:
+        if options.batch == "-":
+            return 1 if run_batch(session, sys.stdin, sys.stdout, options.json) else 0
+        with open(options.batch, encoding="utf-8") as file:
+            return 1 if run_batch(session, file, sys.stdout, options.json) else 0
 
-            if fuzz.ratio(cmd, "add-tag") == 100 or is_ok == "y":
-                try:
-                    name, tag = args
-                    record = book.find(name)
-                    if record and record.note:
-                        record.note.add_tag(tag)
-                        print(f"Tag '{tag}' added to note for contact {name}.")
-                    else:
-                        print(f"Note for contact {name} not found or contact does not exist.")
-                except ValueError as e:
-                    print(e)
-                    print("Invalid command format. Use 'add-tag [name] [tag]'")
-
-       
-        elif fuzz.ratio(cmd, "search-by-tag") > 91:
-            if fuzz.ratio(cmd, "search-by-tag") < 100:
-                is_ok = input("Did you mean to enter 'search-by-tag [tag]'? (y/n): ").lower()
-
-            if fuzz.ratio(cmd, "search-by-tag") == 100 or is_ok == "y":
-                try:
-                    tag = args[0]
-                    matching_records = book.search_by_tag(tag)
-                    if matching_records:
-                        print(f"Found notes with tag '{tag}':")
-                        for record in matching_records:
-                            print(f"Contact {record.name.value}: {record.note}")
-                    else:
-                        print(f"No notes found with tag '{tag}'.")
-                except IndexError as e:
-                    print(e)
-                    print("Invalid command format. Use 'search-by-tag [tag]'")  
-
-        elif cmd == "close" or cmd == "exit":
-            book.save_to_file('addressbook.dat')
-            print("Saving address book and closing the app.")
-            break
-        
-        elif cmd == "save":
-            book.save_to_file('addressbook.dat')
-            print("Saving your contact list")
-
-        elif cmd == "help" or cmd == "?":
-            print ("Avalible commands:")
-            print ("1. add [name] [phone_number] - add user name and 10 digits phone number to address book.")
-            print ("2. add-email [name] [email address] - adding email to user in adres book")
-            print ("3. remove-phone [name] [phone] - removes phone from name")
-            print ("4. change [name] [new_phomne] - change phone for specyfic name")
-            print ("5. all - lists all record in phone book")
-            print ("6. add-birthday [name] [birth_day in (DD.MM.YYYY)] - adding birthday to specyfic name")
-            print ("7. show-birthday [name] - show birthday for user")
-            print ("8. birhdays [number_days] - users who got birthdays from [number_days]")
-            print ("9. NOTES: add-note [name], edit-note [name], remove-note [name] - adding, edit, remove notes from contact name")
-            print ("10. find-by-item [item] - finding by item in address book")
-            print ("11. add-address [name] - adding address to user name")
-            print ("12. add-tag [name] [tag] - adding tag to user name")
-            print ("13. search-by-tag [tag] - search user by tag")
-            print ("14. save - saving data to file")
-            print ("15. close or exit - exit and save results")
+    print ("-----------------------------------------------------------------------------")
+    print("Welcome to Your personal address book. Please provide a command or type help.")
+    print ("-----------------------------------------------------------------------------")
+    autosaver = Autosaver(session, options.save_every, options.save_interval)
+    autosaver.start()
+    try:
+        interact(session, autosaver)
+    finally:
+        autosaver.stop()
+    return 0
 
-        else:
+
+def interact(session, autosaver):
+    while True:
+
+        user_input = input("Enter command: ").strip()
+        cmd, args = parse_input(user_input)
+
+        command, exact = dispatcher.resolve(cmd)
+        if command is None:
             print("Invalid command. Please try again")
+            continue
+
+        if not exact:
+            is_ok = input(f"Did you mean to enter '{command.usage}'? (y/n): ").lower()
+            if is_ok != "y":
+                continue
+
+        with session.lock:
+            stop = run_command(command, session, args)
+        if stop:
+            break
+        autosaver.notify()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
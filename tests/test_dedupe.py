@@ -0,0 +1,106 @@
+import io
+
+import pytest
+
+import main
+from main import AddressBook, Record, Session, run_batch, soundex
+
+
+@pytest.mark.parametrize("word, code", [
+    ("Robert", "R163"), ("Rupert", "R163"), ("Rubin", "R150"), ("Ashcraft", "A261"), ("Tymczak", "T522"),
+    ("Pfister", "P236"), ("Lee", "L000"), ("Łukasz", "L220"), ("123", ""),
+])
+def test_soundex(word, code):
+    assert soundex(word) == code
+
+
+def contact(name, phones=(), emails=(), addresses=(), note=None, tags=None):
+    record = Record(name)
+    for phone in phones:
+        record.add_phone(phone)
+    for email in emails:
+        record.add_email(email)
+    for address in addresses:
+        record.add_address(address)
+    if note is not None:
+        record.add_note(note, tags)
+    return record
+
+
+def sample_book():
+    book = AddressBook()
+    for record in [
+        contact("john_smith", ["1111111111"], ["john@example.com"], note="met at the fair", tags=["work"]),
+        contact("smith_john", ["2222222222"], addresses=["Main Street 1"], note="call back", tags=["vip"]),
+        contact("jon_smith", emails=["JOHN@example.com"]),
+        contact("anna_nowak", ["3333333333"], ["anna@mail.pl"]),
+        contact("ann_novak", ["3333333333"]),
+        contact("maria_lopez", ["4444444444"]),
+    ]:
+        book.add_record(record)
+    return book
+
+
+def test_duplicates_are_proposed_from_shared_keys():
+    proposals = sample_book().find_duplicates(threshold=80, workers=1)
+    assert [(name, other, reasons) for _, name, other, reasons in proposals] == [
+        ("john_smith", "smith_john", ["name"]),
+        ("john_smith", "jon_smith", ["email", "name"]),
+        ("jon_smith", "smith_john", ["name"]),
+        ("ann_novak", "anna_nowak", ["phone"]),
+    ]
+    assert [score for score, *_ in proposals] == sorted((score for score, *_ in proposals), reverse=True)
+
+
+def test_threshold_filters_proposals():
+    book = sample_book()
+    proposals = book.find_duplicates(threshold=0, workers=1)
+    assert all(score >= 99 for score, *_ in book.find_duplicates(threshold=99, workers=1))
+    assert len(book.find_duplicates(threshold=99, workers=1)) < len(proposals)
+
+
+def test_oversized_blocks_are_skipped(monkeypatch):
+    book = AddressBook()
+    for name in ["ann", "bob", "carol"]:
+        book.add_record(contact(name, ["5555555555"]))
+    assert len(book.find_duplicates(threshold=0, workers=1)) == 3
+    monkeypatch.setattr(main, "DEDUPE_MAX_BLOCK", 2)
+    assert book.find_duplicates(threshold=0, workers=1) == []
+
+
+def test_process_pool_scores_like_one_worker(monkeypatch):
+    book = sample_book()
+    monkeypatch.setattr(main, "DEDUPE_CHUNK_SIZE", 2)
+    assert book.find_duplicates(threshold=0, workers=2) == book.find_duplicates(threshold=0, workers=1)
+
+
+def test_merge_keeps_the_most_complete_record():
+    book = sample_book()
+    merged = book.merge_duplicates(book.find_duplicates(threshold=80, workers=1))
+    assert merged == [("anna_nowak", ["ann_novak"]), ("john_smith", ["smith_john", "jon_smith"])]
+    assert sorted(book.data) == ["anna_nowak", "john_smith", "maria_lopez"]
+
+    john = book.find("john_smith")
+    assert [phone.value for phone in john.phones] == ["1111111111", "2222222222"]
+    assert [email.value for email in john.email] == ["john@example.com"]
+    assert [address.value for address in john.address] == ["Main Street 1"]
+    assert john.note.value == "met at the fair; call back"
+    assert list(john.note.tags) == ["work", "vip"]
+    # the indexes follow the merge
+    assert list(book.find_by_phone_prefix("2")) == [("2222222222", "john_smith")]
+    assert [record.name.value for record in book.search_by_tag("vip")] == ["john_smith"]
+
+
+def test_dedupe_command_merges(tmp_path, monkeypatch):
+    monkeypatch.delenv("ADDRESS_BOOK_STORAGE", raising=False)
+    path = str(tmp_path / "book.dat")
+    session = Session(path)
+    session.book.add_record(contact("anna_nowak", ["3333333333"], ["anna@mail.pl"]))
+    session.book.add_record(contact("ann_novak", ["3333333333"]))
+    out = io.StringIO()
+    run_batch(session, ["dedupe 80", "dedupe 80 merge"], out)
+
+    assert "ann_novak <-> anna_nowak" in out.getvalue()
+    assert "Use 'dedupe [min score] merge' to merge them." in out.getvalue()
+    assert "Merged ann_novak into anna_nowak" in out.getvalue()
+    assert sorted(Session(path).book.data) == ["anna_nowak"]
@@ -0,0 +1,89 @@
+import pytest
+from fuzzywuzzy import fuzz
+
+from main import dispatcher
+
+# (command, threshold) in the order of the if/elif fuzz.ratio cascade that
+# CommandDispatcher replaced; the first command clearing its threshold won
+LEGACY_CASCADE = [
+    ("add", 66), ("remove-phone", 91), ("change", 82), ("phone", 79), ("all", 66),
+    ("add-birthday", 91), ("show-birthday", 91), ("birthdays", 88), ("hello", 79),
+    ("add-note", 91), ("edit-note", 91), ("remove-note", 91), ("find-by-note", 91),
+    ("find-by-item", 91), ("add-address", 90), ("remove-address", 66), ("add-email", 66),
+    ("add-tag", 91), ("search-by-tag", 91),
+]
+LEGACY_NAMES = {name for name, _ in LEGACY_CASCADE}
+
+
+def legacy_resolve(cmd):
+    for name, threshold in LEGACY_CASCADE:
+        if fuzz.ratio(cmd, name) > threshold:
+            return name
+    return None
+
+
+def typos(word):
+    """Deletions, transpositions, and substitutions and insertions of a few letters, one edit away from `word`."""
+    letters = "aeiost-"
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    edits = {left + right[1:] for left, right in splits if right}
+    edits |= {left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1}
+    edits |= {left + letter + right[1:] for left, right in splits if right for letter in letters}
+    edits |= {left + letter + right for left, right in splits for letter in letters}
+    edits.discard(word)
+    return sorted(edits)
+
+
+INPUTS = sorted(({typo for name in LEGACY_NAMES for typo in typos(name)} | {"xyz", "a", "zzzzzzzzzzzzzzzzzz", "remove"})
+                - set(dispatcher.commands))
+
+
+def accepting(cmd):
+    """{command: score} for every fuzzy-matchable command whose threshold `cmd` clears."""
+    scores = {command: fuzz.ratio(cmd, command.name) for command in dispatcher.order}
+    return {command: score for command, score in scores.items() if score > command.threshold}
+
+
+def test_legacy_commands_keep_their_thresholds():
+    for name, threshold in LEGACY_CASCADE:
+        assert dispatcher.commands[name].threshold == threshold
+
+
+@pytest.mark.parametrize("name", sorted(dispatcher.commands))
+def test_registered_names_resolve_exactly(name):
+    assert dispatcher.resolve(name) == (dispatcher.commands[name], True)
+
+
+def test_length_buckets_skip_no_match():
+    # resolve() only scores commands whose length can still clear their threshold;
+    # it must find as good a match as scoring every command
+    for cmd in INPUTS:
+        scores = accepting(cmd)
+        command, exact = dispatcher.resolve(cmd)
+        assert not exact
+        if scores:
+            assert scores.get(command) == max(scores.values()), cmd
+        else:
+            assert command is None, cmd
+
+
+def test_matches_at_least_as_well_as_legacy_cascade():
+    for cmd in INPUTS:
+        legacy = legacy_resolve(cmd)
+        command, _ = dispatcher.resolve(cmd)
+        if legacy is None:
+            # only commands the cascade did not know may pick up what it rejected
+            assert command is None or command.name not in LEGACY_NAMES, cmd
+        else:
+            # the cascade took the first command over its threshold, the
+            # dispatcher the best one, so it can only do better
+            assert command is not None, cmd
+            assert fuzz.ratio(cmd, command.name) >= fuzz.ratio(cmd, legacy), cmd
+
+
+def test_unambiguous_typos_resolve_as_before():
+    # a typo of a command that only that command accepts resolves to it in both
+    for cmd in INPUTS:
+        commands = list(accepting(cmd))
+        if len(commands) == 1 and commands[0].name in LEGACY_NAMES:
+            assert legacy_resolve(cmd) == commands[0].name == dispatcher.resolve(cmd)[0].name, cmd
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+
+import pytest
+
+from main import AddressBook, Record, Session, export_contacts, import_contacts, record_to_row, run_batch
+
+
+def sample_book():
+    book = AddressBook()
+    ann = Record("ann")
+    ann.add_phone("1234567890")
+    ann.add_email("ann@example.com")
+    ann.add_birthday("01.02.1990")
+    ann.add_address("Main Street 1")
+    ann.add_note("met at the conference", ["work", "vip"])
+    book.add_record(ann)
+    bob = Record("bob")
+    bob.add_phone("1111111111")
+    bob.add_phone("2222222222")
+    book.add_record(bob)
+    return book
+
+
+def rows(book):
+    return {name: record_to_row(book.data[name]) for name in book.data}
+
+
+@pytest.mark.parametrize("extension", ["csv", "jsonl"])
+def test_export_import_round_trip(tmp_path, extension):
+    book = sample_book()
+    filename = str(tmp_path / f"contacts.{extension}")
+    assert export_contacts(book, filename) == 2
+
+    imported = AddressBook()
+    assert import_contacts(imported, filename, workers=1) == (2, 0)
+    assert rows(imported) == rows(book)
+
+
+BAD_ROWS = [
+    {"name": 123, "phones": ["1234567890"]},
+    {"name": "carol", "phones": [1234567890]},
+    {"name": "dave", "phones": "1234567890"},
+    {"name": "erin", "note": ["not", "a", "string"]},
+    {"name": "frank", "phones": ["12345"]},
+    {"name": "grace", "tags": ["work"]},
+    ["not", "an", "object"],
+]
+
+
+def test_bad_rows_go_to_error_report(tmp_path):
+    filename = tmp_path / "contacts.jsonl"
+    lines = [json.dumps({"name": "ann", "phones": ["1234567890"]})] + [json.dumps(row) for row in BAD_ROWS]
+    lines.append("{not json")
+    filename.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    errors = tmp_path / "errors.csv"
+
+    book = AddressBook()
+    assert import_contacts(book, str(filename), errors_filename=str(errors), workers=1) == (1, len(BAD_ROWS) + 1)
+    assert list(book.data) == ["ann"]
+    assert list(book.find_by_phone_prefix("1")) == [("1234567890", "ann")]
+    with open(errors, newline="", encoding="utf-8") as file:
+        report = list(csv.DictReader(file))
+    assert [int(row["line"]) for row in report] == list(range(2, len(lines) + 1))
+
+
+def test_bad_import_does_not_abort_batch(tmp_path, monkeypatch):
+    monkeypatch.delenv("ADDRESS_BOOK_STORAGE", raising=False)
+    source = tmp_path / "contacts.jsonl"
+    source.write_text(json.dumps({"name": 123, "phones": ["1234567890"]}) + "\n", encoding="utf-8")
+    path = str(tmp_path / "book.dat")
+    out = io.StringIO()
+    run_batch(Session(path), ["add ann 1234567890", f"import {source}", "add bob 1111111111"], out)
+
+    assert "1 rows rejected" in out.getvalue()
+    assert sorted(Session(path).book.data) == ["ann", "bob"]
@@ -0,0 +1,203 @@
+import copy
+import re
+
+import pytest
+
+from main import AddressBook, Record, load_address_book_from_file
+
+
+def contact(name, phones=(), emails=(), addresses=(), note=None, tags=None):
+    record = Record(name)
+    for phone in phones:
+        record.add_phone(phone)
+    for email in emails:
+        record.add_email(email)
+    for address in addresses:
+        record.add_address(address)
+    if note is not None:
+        record.add_note(note, tags)
+    return record
+
+
+CONTACTS = [
+    contact("ann", ["1234567890", "1239999999"], ["ann@example.com"], ["Kraków, ul. Długa 5"],
+            "Met at the PyCon conference", ["work", "vip"]),
+    contact("bob", ["1240000000"], ["bob@mail.example.com"], ["Main Street 1"], "call back on Monday", ["family"]),
+    contact("carol", ["5550000000"], ["carol@examplex.com"], ["ul. Długa 7, Warszawa"], "50% off (coupon)", ["work"]),
+    contact("dave", [], ["dave@foo.org"], [], "İstanbul office", []),
+    contact("erin"),
+]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def book(request, tmp_path):
+    if request.param == "memory":
+        book = AddressBook()
+    else:
+        book = load_address_book_from_file(str(tmp_path / "book.dat"), sqlite=True)
+    # copies, so that tests changing contacts do not leak into the next one
+    for record in copy.deepcopy(CONTACTS):
+        book.add_record(record)
+    if request.param == "sqlite":
+        book.save_to_file(str(tmp_path / "book.dat"))
+        book.close()
+        book = load_address_book_from_file(str(tmp_path / "book.dat"))
+    yield book
+    book.close()
+
+
+def test_phone_prefix(book):
+    assert list(book.find_by_phone_prefix("123")) == [("1234567890", "ann"), ("1239999999", "ann")]
+    assert list(book.find_by_phone_prefix("12", 2)) == [("1234567890", "ann"), ("1239999999", "ann")]
+    assert list(book.find_by_phone_prefix("12", 0)) == []
+    assert list(book.find_by_phone_prefix("9")) == []
+
+
+def test_negative_phone_limit_is_rejected(book):
+    with pytest.raises(ValueError):
+        list(book.find_by_phone_prefix("12", -1))
+
+
+NOTE_PATTERNS = [
+    "conference", "CONFERENCE", "pycon", "py.on", "con(f|v)erence", "(?:call|met) ", "call back on", "back|office",
+    "50%", r"\(coupon\)", "istanbul", "İSTANBUL", "office$", "^met", "mon.ay", "c{2}|l{2}", "of+", "(?:off){2}",
+    "[0-9]+% off", "con(?:ference)?", "xyz", "", ".", r"\bat\b", "(?i)PYCON", "ann",
+]
+
+
+@pytest.mark.parametrize("pattern", NOTE_PATTERNS)
+def test_note_search_matches_full_scan(book, pattern):
+    # the trigram prefilter may only rule out notes the regex cannot match
+    expected = sorted(record.name.value for record in CONTACTS
+                      if record.note and re.search(pattern, record.note.value, re.IGNORECASE))
+    assert book.find_by_note(pattern) == expected
+
+
+def test_note_search_follows_edits(book):
+    frank = contact("frank", note="weekly standup")
+    book.add_record(frank)
+    assert book.find_by_note("standup") == ["frank"]
+    frank.edit_note("quarterly review")
+    assert book.find_by_note("standup") == []
+    assert book.find_by_note("review") == ["frank"]
+    frank.remove_note()
+    assert book.find_by_note("review") == []
+
+
+def test_similar_names(book):
+    assert book.find_similar("carl", 1) == [("carol", 89)]
+    assert book.find_similar("erin")[0] == ("erin", 100)
+    assert book.find_similar("ann", 0) == []
+    with pytest.raises(ValueError):
+        book.find_similar("ann", -1)
+
+
+def similar_by_scan(book, name, limit):
+    from fuzzywuzzy import fuzz
+    scored = [(other, fuzz.ratio(name.lower(), other.lower())) for other in book.data]
+    return sorted(scored, key=lambda match: (-match[1], match[0]))[:limit]
+
+
+def test_similar_names_match_full_scan():
+    book = AddressBook()
+    for first in ["anna", "jan", "kasia", "tomasz", "ewa", "li"]:
+        for last in ["nowak", "kowalski", "kim", "smith"]:
+            for i in range(0, 300, 7):
+                book.add_record(Record(f"{first}_{last}_{i}"))
+    for name in ["ana_nowak_21", "jan_kowalsky_140", "kasia_kim_2l0", "tomasz_smith_", "ewa", "li_kim_7x"]:
+        assert book.find_similar(name, 5) == similar_by_scan(book, name, 5), name
+    # names sharing no trigram with the query are not similar at all
+    assert book.find_similar("zzz") == []
+
+
+def test_typo_found_among_many_similar_names(monkeypatch):
+    book = AddressBook()
+    for i in range(5000):
+        book.add_record(Record(f"katarzyna{i}"))
+        book.add_record(Record(f"katarzyna_{i:04}"))
+    book.add_record(Record("katarzyna"))
+    assert book.find_similar("katarzyma", 1) == [("katarzyna", 89)]
+    assert book.find_similar("katarzyma_1234", 1) == [("katarzyna_1234", 93)]
+    # the rarest trigrams still lead to a one-letter typo on a tiny walk budget
+    monkeypatch.setattr(AddressBook, "SIMILAR_WALK_BUDGET", 100)
+    assert book.find_similar("katarzyma_1234", 1) == [("katarzyna_1234", 93)]
+
+
+def test_similar_names_follow_deletes(book):
+    book.delete("carol")
+    assert "carol" not in [other for other, _ in book.find_similar("carol")]
+
+
+def names_of(records):
+    return [record.name.value for record in records]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("work", ["ann", "carol"]),
+    ("work AND vip", ["ann"]),
+    ("work vip", ["ann"]),
+    ("work OR family", ["ann", "bob", "carol"]),
+    ("work NOT vip", ["carol"]),
+    ("NOT work", ["bob", "dave", "erin"]),
+    ("NOT (work OR family)", ["dave", "erin"]),
+    ("(family or vip) and not carol", ["ann", "bob"]),
+    ("NOT NOT vip", ["ann"]),
+    ("unknown", []),
+])
+def test_tag_queries(book, query, expected):
+    assert names_of(book.search_by_tags(query)) == expected
+
+
+@pytest.mark.parametrize("query", ["", "work AND", "(work", "work )", "OR work", "NOT"])
+def test_invalid_tag_query_is_rejected(book, query):
+    with pytest.raises(ValueError):
+        book.search_by_tags(query)
+
+
+def test_tag_index_follows_edits(book):
+    assert names_of(book.search_by_tag("vip")) == ["ann"]
+    book.add_tag_to_note("carol", "vip")
+    assert names_of(book.search_by_tag("vip")) == ["ann", "carol"]
+    assert names_of(book.search_by_tags("vip NOT family")) == ["ann", "carol"]
+    book.find("carol").remove_note()
+    assert names_of(book.search_by_tag("vip")) == ["ann"]
+    assert names_of(book.search_by_tags("work")) == ["ann"]
+
+
+@pytest.mark.parametrize("domain, expected", [
+    ("example.com", ["ann", "bob"]),
+    ("EXAMPLE.com", ["ann", "bob"]),
+    ("@example.com", ["ann", "bob"]),
+    ("mail.example.com", ["bob"]),
+    ("com", ["ann", "bob", "carol"]),
+    ("examplex.com", ["carol"]),
+    ("ample.com", []),
+    ("org", ["dave"]),
+    ("net", []),
+])
+def test_domain_search(book, domain, expected):
+    assert book.find_by_domain(domain) == expected
+
+
+@pytest.mark.parametrize("words, expected", [
+    ("dluga", ["ann", "carol"]),
+    ("Długa 5", ["ann"]),
+    ("KRAKÓW ul", ["ann"]),
+    ("krakow, ul. dluga", ["ann"]),
+    ("main street", ["bob"]),
+    ("street 5", []),
+    ("dlu", []),
+    (" , ", []),
+])
+def test_address_search(book, words, expected):
+    assert book.find_by_address(words) == expected
+
+
+def test_domain_and_address_indexes_follow_edits(book):
+    book.find("bob").add_email("bob@corp.io")
+    book.find("erin").add_address("Długa 9, Gdańsk")
+    assert book.find_by_domain("corp.io") == ["bob"]
+    assert book.find_by_address("dluga") == ["ann", "carol", "erin"]
+    book.find("ann").remove_address("Kraków, ul. Długa 5")
+    assert book.find_by_address("dluga") == ["carol", "erin"]
+    assert book.find_by_address("gdansk") == ["erin"]
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from main import AddressBook, AddressBookServer, Session, send_commands
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    monkeypatch.delenv("ADDRESS_BOOK_STORAGE", raising=False)
+
+
+def run_server(path, *clients):
+    """Start a server on `path`, run every client coroutine factory against its port concurrently,
+    stop the server and return the clients' results."""
+    async def run():
+        server = AddressBookServer(Session(str(path)))
+        await server.start()
+        try:
+            return await asyncio.gather(*(client(server.port) for client in clients))
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+
+def test_pipelined_replies_come_back_in_order(tmp_path):
+    commands = ["add ann 1234567890", "add-email ann ann@example.com", "phone ann", "frobnicate", "find-by-domain example.com"]
+    [replies] = run_server(tmp_path / "book.dat", lambda port: send_commands(commands, port=port))
+
+    assert [reply["id"] for reply in replies] == list(range(len(commands)))
+    assert [reply["ok"] for reply in replies] == [True, True, True, False, True]
+    assert replies[2]["output"] == ["Phone number for ann: 1234567890"]
+    assert replies[3]["output"] == ["Unknown command 'frobnicate'"]
+    assert replies[4]["output"] == ["Contacts with an e-mail at example.com:", "ann"]
+
+
+def test_failing_command_gets_error_reply(tmp_path, monkeypatch):
+    def broken(self, domain):
+        raise RuntimeError("index unavailable")
+    monkeypatch.setattr(AddressBook, "find_by_domain", broken)
+    commands = ["add ann 1234567890", "find-by-domain example.com", "phone ann"]
+    [replies] = run_server(tmp_path / "book.dat", lambda port: send_commands(commands, port=port))
+
+    assert [reply["ok"] for reply in replies] == [True, False, True]
+    assert "index unavailable" in replies[1]["output"][0]
+    assert replies[2]["output"] == ["Phone number for ann: 1234567890"]
+
+
+def test_changes_from_concurrent_clients_are_saved(tmp_path):
+    path = tmp_path / "book.dat"
+    clients = [lambda port, i=i: send_commands([f"add contact{i} {1000000000 + i}"], port=port) for i in range(5)]
+    results = run_server(path, *clients)
+
+    assert all(replies[0]["ok"] for replies in results)
+    assert sorted(Session(str(path)).book.data) == [f"contact{i}" for i in range(5)]
@@ -0,0 +1,278 @@
+import pickle
+from pathlib import Path
+
+import pytest
+
+import main
+from main import AddressBook, CorruptBookError, Record, Session, load_address_book_from_file, record_to_row
+
+STORAGES = [None, "journal", "lazy", "sharded", "sqlite"]
+# (file written by, storage asked to open it) pairs that are refused rather than converted
+REFUSED = {("sqlite", "journal"), ("sqlite", "lazy"), ("sqlite", "sharded"), ("sharded", "journal"), ("sharded", "lazy"),
+           ("sharded", "sqlite"), ("lazy", "journal"), ("lazy", "sharded"), ("lazy", "sqlite")}
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    for variable in ("ADDRESS_BOOK_STORAGE", "ADDRESS_BOOK_SHARDS", "ADDRESS_BOOK_COMPRESSION"):
+        monkeypatch.delenv(variable, raising=False)
+
+
+def fill(book):
+    ann = Record("ann")
+    ann.add_phone("1234567890")
+    ann.add_email("ann@example.com")
+    ann.add_birthday("29.02.1992")
+    ann.add_note("met at the conference", ["work", "vip"])
+    book.add_record(ann)
+    bob = Record("bob")
+    bob.add_phone("1111111111")
+    bob.add_phone("2222222222")
+    bob.add_address("Kraków, ul. Długa 5")
+    book.add_record(bob)
+    for i in range(5):
+        record = Record(f"contact{i}")
+        record.add_phone(f"{5000000000 + i}")
+        book.add_record(record)
+    book.find("ann").note.add_tag("family")
+
+
+def edit(book):
+    book.find("ann").edit_phone("1234567890", "9999999999")
+    book.find("ann").add_address("Main Street 1")
+    book.find("bob").add_note("call back")
+    book.delete("contact0")
+    carol = Record("carol")
+    carol.add_email("carol@mail.example.com")
+    book.add_record(carol)
+
+
+def contents(book):
+    rows = {}
+    for name in book.data:
+        row = record_to_row(book.data[name])
+        row["tags"] = sorted(row["tags"])
+        rows[name] = row
+    return rows
+
+
+def open_session(path, storage):
+    return Session(str(path), storage)
+
+
+def save_and_close(session):
+    session.save()
+    session.address_book.close()
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_round_trip(tmp_path, storage):
+    path = tmp_path / "book.dat"
+    session = open_session(path, storage)
+    fill(session.book)
+    expected = contents(session.book)
+    save_and_close(session)
+
+    session = open_session(path, storage)
+    assert contents(session.book) == expected
+    edit(session.book)
+    expected = contents(session.book)
+    save_and_close(session)
+
+    assert contents(open_session(path, storage).book) == expected
+
+
+@pytest.mark.parametrize("source, target", [(source, target) for source in STORAGES for target in STORAGES
+                                            if source != target])
+def test_switching_storage(tmp_path, source, target):
+    path = tmp_path / "book.dat"
+    session = open_session(path, source)
+    fill(session.book)
+    expected = contents(session.book)
+    save_and_close(session)
+
+    session = open_session(path, target)
+    if (source, target) in REFUSED:
+        with pytest.raises(ValueError):
+            session.book
+    else:
+        assert contents(session.book) == expected
+        edit(session.book)
+        expected = contents(session.book)
+        save_and_close(session)
+    # whatever the last storage was, the default one reads the book back
+    assert contents(open_session(path, None).book) == expected
+
+
+def test_journal_entries_survive_opening_in_default_mode(tmp_path):
+    path = tmp_path / "book.dat"
+    session = open_session(path, "journal")
+    fill(session.book)
+    expected = contents(session.book)
+    save_and_close(session)
+
+    session = open_session(path, None)
+    assert contents(session.book) == expected
+    assert not (tmp_path / "book.dat.journal").exists()
+
+
+def test_default_mode_save_is_not_overwritten_by_old_journal(tmp_path):
+    path = tmp_path / "book.dat"
+    session = open_session(path, "journal")
+    fill(session.book)
+    save_and_close(session)
+
+    session = open_session(path, None)
+    session.book.find("ann").add_email("ann@work.example.com")
+    session.book.find("bob").add_phone("3333333333")
+    expected = contents(session.book)
+    save_and_close(session)
+
+    assert contents(open_session(path, "journal").book) == expected
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch, request):
+    """A saved book of several chunks, as (path, file bytes, contents)."""
+    monkeypatch.setattr(main, "SNAPSHOT_CHUNK", 2)
+    monkeypatch.setenv("ADDRESS_BOOK_COMPRESSION", request.param)
+    path = tmp_path / "book.dat"
+    book = AddressBook()
+    fill(book)
+    book.save_to_file(str(path))
+    return path, path.read_bytes(), contents(book)
+
+
+@pytest.mark.parametrize("snapshot", main.COMPRESSIONS, indirect=True)
+def test_snapshot_round_trip(snapshot):
+    path, _, expected = snapshot
+    assert contents(load_address_book_from_file(str(path))) == expected
+
+
+@pytest.mark.parametrize("snapshot", main.COMPRESSIONS, indirect=True)
+def test_truncated_snapshot_is_detected(snapshot):
+    path, data, _ = snapshot
+    for length in range(1, len(data)):
+        path.write_bytes(data[:length])
+        with pytest.raises(CorruptBookError):
+            load_address_book_from_file(str(path))
+
+
+@pytest.mark.parametrize("snapshot", main.COMPRESSIONS, indirect=True)
+def test_bit_flipped_snapshot_is_detected(snapshot):
+    path, data, _ = snapshot
+    # the journal sequence number in the header is the only unchecked field
+    seq = range(10, main.SNAPSHOT_HEADER.size)
+    for position in range(len(data)):
+        if position in seq:
+            continue
+        flipped = bytearray(data)
+        flipped[position] ^= 0x01
+        path.write_bytes(bytes(flipped))
+        with pytest.raises(CorruptBookError):
+            load_address_book_from_file(str(path))
+
+
+def test_journal_torn_tail_is_cut_off(tmp_path):
+    path = tmp_path / "book.dat"
+    journal = tmp_path / "book.dat.journal"
+    session = open_session(path, "journal")
+    fill(session.book)
+    expected = contents(session.book)
+    save_and_close(session)
+    good = journal.read_bytes()
+    # a crash halfway through appending the next entry
+    entry = pickle.dumps((10 ** 6, "add_phone", "ann", ("4444444444",)))
+    journal.write_bytes(good + entry[:len(entry) // 2])
+
+    session = open_session(path, "journal")
+    assert contents(session.book) == expected
+    assert journal.read_bytes() == good
+    session.book.find("ann").add_phone("5555555555")
+    expected = contents(session.book)
+    save_and_close(session)
+
+    assert contents(open_session(path, "journal").book) == expected
+
+
+def test_journal_replays_only_entries_newer_than_snapshot(tmp_path):
+    path = tmp_path / "book.dat"
+    journal = tmp_path / "book.dat.journal"
+    session = open_session(path, "journal")
+    fill(session.book)
+    expected = contents(session.book)
+    save_and_close(session)
+    entries = journal.read_bytes()
+
+    # a crash after compaction wrote the snapshot but before it truncated the journal
+    session = open_session(path, "journal")
+    session.book.compact(str(path))
+    session.address_book.close()
+    journal.write_bytes(entries)
+
+    session = open_session(path, "journal")
+    assert contents(session.book) == expected
+    session.book.find("ann").add_phone("5555555555")
+    expected = contents(session.book)
+    save_and_close(session)
+
+    assert contents(open_session(path, "journal").book) == expected
+
+
+@pytest.mark.parametrize("shards", [0, 4])
+def test_snapshot_keeps_state_while_edits_continue(tmp_path, shards):
+    path = tmp_path / "book.dat"
+    book = load_address_book_from_file(str(path), shards=shards)
+    fill(book)
+    before = contents(book)
+    with book.save_lock:
+        write = book.prepare_save(str(path))
+        edit(book)
+        book.find("bob").note.add_tag("urgent")
+        after = contents(book)
+        write()
+
+    assert contents(load_address_book_from_file(str(path))) == before
+    assert contents(book) == after
+    assert book.dirty
+    book.save_to_file(str(path))
+    assert not book.dirty
+    assert contents(load_address_book_from_file(str(path))) == after
+
+
+def test_journal_is_compacted_across_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Journal, "COMPACT_AFTER", 10)
+    path = tmp_path / "book.dat"
+    journal = tmp_path / "book.dat.journal"
+    for run in range(4):
+        session = open_session(path, "journal")
+        for i in range(4):
+            record = Record(f"run{run}contact{i}")
+            record.add_phone(f"{1000000000 + run * 10 + i}")
+            session.book.add_record(record)
+        expected = contents(session.book)
+        save_and_close(session)
+        # fewer than COMPACT_AFTER changes per run, but they add up
+        assert len(list(main.Journal.read(str(journal)))) < 10
+
+    assert path.exists()
+    assert contents(open_session(path, "journal").book) == expected
+
+
+def test_damaged_legacy_pickle_is_reported(tmp_path):
+    # the book shipped with the repository predates the snapshot format
+    data = (Path(main.__file__).parent / "addressbook.dat").read_bytes()
+    path = tmp_path / "book.dat"
+    path.write_bytes(data)
+    assert len(load_address_book_from_file(str(path)).data) > 0
+    for position in range(len(data)):
+        for bit in (0x02, 0x10, 0x80):
+            flipped = bytearray(data)
+            flipped[position] ^= bit
+            path.write_bytes(bytes(flipped))
+            # without a checksum some damage goes unnoticed, e.g. a changed
+            # letter in a name; anything else must be reported, not raised
+            try:
+                load_address_book_from_file(str(path))
+            except CorruptBookError:
+                pass
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+from main import Record, Session, Workspace, run_batch
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    monkeypatch.delenv("ADDRESS_BOOK_STORAGE", raising=False)
+
+
+def add_contacts(book, *names):
+    for i, name in enumerate(names):
+        record = Record(name)
+        record.add_phone(f"{1000000000 + i}")
+        book.add_record(record)
+
+
+def saved_names(path):
+    return sorted(Session(str(path)).book.data)
+
+
+def test_least_recently_used_book_is_saved_and_evicted(tmp_path):
+    workspace = Workspace(str(tmp_path), memory_budget=3 * Workspace.CONTACT_BYTES)
+    add_contacts(workspace.use("a"), "ann", "bob")
+    add_contacts(workspace.use("b"), "carol")
+    assert list(workspace.sessions) == ["a", "b"]
+
+    add_contacts(workspace.use("c"), "dave")
+    # the next command finds four contacts loaded: "a" goes first, and its
+    # changes are written back
+    workspace.book
+    assert list(workspace.sessions) == ["b", "c"]
+    assert saved_names(tmp_path / "a.dat") == ["ann", "bob"]
+    assert not (tmp_path / "b.dat").exists()
+
+    assert sorted(workspace.use("a").data) == ["ann", "bob"]
+    assert list(workspace.sessions) == ["c", "a"]
+    assert saved_names(tmp_path / "b.dat") == ["carol"]
+
+
+def test_current_book_is_kept_over_budget(tmp_path):
+    workspace = Workspace(str(tmp_path), memory_budget=0)
+    add_contacts(workspace.use("big"), "ann", "bob", "carol")
+    assert list(workspace.sessions) == ["big"]
+    workspace.save()
+    assert saved_names(tmp_path / "big.dat") == ["ann", "bob", "carol"]
+
+
+def test_switching_back_reuses_the_loaded_book(tmp_path):
+    workspace = Workspace(str(tmp_path))
+    first = workspace.use("a")
+    workspace.use("b")
+    assert workspace.use("a") is first
+    assert list(workspace.sessions) == ["b", "a"]
+
+
+@pytest.mark.parametrize("name", ["", "../a", "a b", "a.dat"])
+def test_invalid_book_name_is_rejected(tmp_path, name):
+    with pytest.raises(ValueError):
+        Workspace(str(tmp_path)).use(name)
+
+
+def test_use_and_books_commands(tmp_path):
+    old = Session(str(tmp_path / "old.dat"))
+    add_contacts(old.book, "ann")
+    old.save()
+    workspace = Workspace(str(tmp_path))
+    out = io.StringIO()
+    run_batch(workspace, ["use new", "add bob 1234567890", "use old", "books"], out)
+
+    assert "Using new book new" in out.getvalue()
+    assert "Using book old (1 contacts)" in out.getvalue()
+    assert "* old (loaded, 1 contacts)" in out.getvalue()
+    assert "  new (loaded, 1 contacts)" in out.getvalue()
+    assert saved_names(tmp_path / "new.dat") == ["bob"]